@@ -1,4 +1,10 @@
 # pylint: disable=missing-module-docstring
 
-from . import _version
-__version__ = _version.get_versions()['version']
+
+def __getattr__(name):
+    # versioneer may run git; only pay for it when the version is asked for
+    if name == '__version__':
+        from . import _version  # pylint: disable=import-outside-toplevel
+        version = globals()['__version__'] = _version.get_versions()['version']
+        return version
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
@@ -0,0 +1,6 @@
+# pylint: disable=missing-module-docstring
+
+import sys
+from .update import main
+
+sys.exit(main())
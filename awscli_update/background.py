@@ -0,0 +1,135 @@
+'''`--background` and `--max-write-rate`: stay out of the way of the workload
+
+--background lowers the priority of the run and everything it starts (the
+installer, sudo, gc) the way `nice -n 19 ionice -c2 -n7` would, and drops
+the installer archive from the page cache once it has been extracted, so a
+cron run does not evict the application's hot data. The extracted tree of
+aws/install is removed afterwards, which frees its pages as well.
+
+--max-write-rate limits how fast the download and the extraction write, for
+disks that are shared with latency sensitive work.
+
+spawn() starts the follow-up commands of an update (gc, prewarm) detached
+from the run, through `nice -n 19 ionice -c3` so they only use the disk when
+nothing else does.'''
+
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+NICENESS = 19
+# ioprio_set(2) is not in the os module; numbers of the AWS CLI platforms
+IOPRIO_SET = {'x86_64': 251, 'aarch64': 30}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_BE = 2
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_LOWEST = 7
+BURST = 1.0
+
+
+def set_io_priority(ioclass=IOPRIO_CLASS_BE, level=IOPRIO_LOWEST):
+    '''sets the IO priority of this process (and its future children), returns success'''
+    number = IOPRIO_SET.get(os.uname().machine)
+    if number is None:
+        return False
+    import ctypes  # pylint: disable=import-outside-toplevel
+    libc = ctypes.CDLL(None, use_errno=True)
+    return libc.syscall(number, IOPRIO_WHO_PROCESS, 0,
+                        (ioclass << IOPRIO_CLASS_SHIFT) | level) == 0
+
+def lower_priority():
+    '''lowers the CPU and IO priority of this process, returns what was applied'''
+    applied = []
+    try:
+        current = os.nice(0)
+        if current < NICENESS:
+            os.nice(NICENESS - current)
+        applied.append('nice %d' % os.nice(0))
+    except (AttributeError, OSError):
+        pass
+    try:
+        if set_io_priority():
+            applied.append('io best-effort %d' % IOPRIO_LOWEST)
+    except (AttributeError, OSError):
+        pass
+    return applied
+
+def drop_cache(path):
+    '''writes back and evicts the file at path from the page cache, where supported'''
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        # dirty pages cannot be dropped, write them back first
+        os.fdatasync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    except (AttributeError, OSError):
+        pass
+    finally:
+        os.close(fd)
+
+def idle_command():
+    '''returns the command prefix that runs a command at idle CPU and IO priority
+
+    A prefix rather than a preexec_fn: that is not safe in a process with
+    threads, and the priorities are passed on through sudo.'''
+    command = []
+    if shutil.which('nice'):
+        command += ['nice', '-n', str(NICENESS)]
+    if shutil.which('ionice'):
+        command += ['ionice', '-c%d' % IOPRIO_CLASS_IDLE]
+    return command
+
+def spawn(arguments, prefix=None, sudo=False):
+    '''runs `awscli-update [--prefix prefix] arguments...` detached at idle priority'''
+    # the run that spawned it is already in the history
+    command = [sys.executable, '-m', 'awscli_update', '--no-history']
+    if prefix:
+        command += ['--prefix', os.path.abspath(prefix)]
+    command += arguments
+    if sudo:
+        command = ['sudo', '-n', *command]
+    command = idle_command() + command
+    # `python -m` finds the package through the working directory, even
+    # when sudo resets the environment
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.Popen(  # pylint: disable=consider-using-with
+        command,
+        cwd=package_root,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True)
+
+
+class Throttle:
+    '''limits the bytes passed through per second, shared by all threads'''
+    def __init__(self, rate):
+        self.rate = rate
+        self.start = None
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def consume(self, size):
+        '''accounts for size bytes, sleeping while above the rate'''
+        with self.lock:
+            now = time.monotonic()
+            if self.start is None:
+                self.start = now
+            # pauses (e.g. between download and extraction) save up at most BURST seconds
+            self.start = max(self.start, now - self.bytes / self.rate - BURST)
+            self.bytes += size
+            ahead = self.bytes / self.rate - (now - self.start)
+        if ahead > 0:
+            time.sleep(ahead)
+
+    def limit(self, chunks):
+        '''passes chunks through at no more than the rate'''
+        for chunk in chunks:
+            self.consume(len(chunk))
+            yield chunk
@@ -0,0 +1,85 @@
+'''offline bundles: cached installer artifacts, manifests and the version state
+
+A bundle is a tarball with the same layout as the cache directory, so
+importing it just pre-seeds the cache of another host.'''
+
+import io
+import json
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+import time
+from . import cache, layout
+
+MEMBER_REGEX = re.compile(
+    r'artifacts/[A-Za-z0-9][A-Za-z0-9._-]*|manifests/[0-9.]+\.json|state\.json')
+COMPRESSION = (('.tar.gz', 'gz'), ('.tgz', 'gz'), ('.tar.xz', 'xz'), ('.tar.bz2', 'bz2'))
+
+
+def _mode(path, operation):
+    for suffix, compression in COMPRESSION:
+        if path.endswith(suffix):
+            return '%s:%s' % (operation, compression)
+    # artifacts are compressed already, a plain tar is as small and faster
+    return operation if operation == 'w' else 'r:*'
+
+def _add_state(tar, latest):
+    data = json.dumps({'latest': latest, 'checked': time.time()},
+                      separators=(',', ':')).encode('utf-8')
+    info = tarfile.TarInfo('state.json')
+    info.size = len(data)
+    info.mtime = int(time.time())
+    info.mode = 0o644
+    tar.addfile(info, io.BytesIO(data))
+
+def export_bundle(path, artifacts, versions):
+    '''writes the given cached artifacts, the manifests of versions and a state
+
+    The state names the newest of versions as the latest one, so `--offline`
+    on the importing host installs a version that is in the bundle.'''
+    with tarfile.open(path, _mode(path, 'w')) as tar:
+        for name in artifacts:
+            tar.add(cache.artifact_path(name), 'artifacts/%s' % name)
+        for version in versions:
+            manifest = cache.manifest_path(version)
+            if os.path.isfile(manifest):
+                tar.add(manifest, 'manifests/%s.json' % version)
+        releases = [version for version in versions if layout.is_version(version)]
+        if releases:
+            _add_state(tar, max(releases, key=layout.version_key))
+
+def _merge_state(tar, member):
+    state = cache.load_state()
+    with tar.extractfile(member) as file:
+        imported = cache.decode_json(file.read())
+    if not imported or not layout.is_version(imported.get('latest', '')):
+        return
+    if state and layout.version_key(state['latest']) >= layout.version_key(imported['latest']):
+        return
+    cache.write_json(cache.state_path(), imported)
+
+def import_bundle(path):
+    '''adds the contents of a bundle to the cache, returns the imported names'''
+    imported = []
+    with tarfile.open(path, _mode(path, 'r')) as tar:
+        for member in tar:
+            if not member.isfile() or not MEMBER_REGEX.fullmatch(member.name):
+                continue
+            if member.name == 'state.json':
+                _merge_state(tar, member)
+                imported.append(member.name)
+                continue
+            target = os.path.join(cache.cache_dir(), member.name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), prefix='.tmp-')
+            try:
+                with os.fdopen(fd, 'wb') as dst, tar.extractfile(member) as src:
+                    shutil.copyfileobj(src, dst, 1 << 20)
+                os.replace(tmp, target)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+            imported.append(member.name)
+    return imported
@@ -0,0 +1,132 @@
+'''local cache of awscli-update (archives, digests, manifests, fingerprints, version state)'''
+
+import contextlib
+import json
+import os
+import tempfile
+import time
+
+
+def cache_dir():
+    '''returns the cache directory, honoring AWSCLI_UPDATE_CACHE and XDG_CACHE_HOME'''
+    path = os.environ.get('AWSCLI_UPDATE_CACHE')
+    if not path:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+        path = os.path.join(base, 'awscli-update')
+    return path
+
+def _path(*parts):
+    return os.path.join(cache_dir(), *parts)
+
+def read_json(path):
+    '''returns the decoded JSON file or None if it is missing or broken'''
+    try:
+        with open(path, 'rb') as file:
+            return decode_json(file.read())
+    except OSError:
+        return None
+
+def decode_json(content):
+    '''returns the decoded JSON document or None if it is broken'''
+    try:
+        return json.loads(content)
+    except ValueError:
+        return None
+
+def write_json(path, data):
+    '''atomically replaces path with the JSON encoded data'''
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w') as file:
+            json.dump(data, file, separators=(',', ':'))
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+def artifact_path(name):
+    '''returns the path of a cached installer artifact'''
+    return _path('artifacts', name)
+
+@contextlib.contextmanager
+def artifact_writer(path):
+    '''yields a file that atomically becomes the artifact at path when the block succeeds'''
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            yield file
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+def save_artifact(path, content):
+    '''atomically stores a downloaded installer artifact'''
+    with artifact_writer(path) as file:
+        file.write(content)
+
+def digest_path(name):
+    '''returns the path of the recorded checksum of a cached artifact'''
+    return _path('digests', '%s.json' % name)
+
+def load_digest(name):
+    '''returns {'sha256': hex digest, 'signed': bool} of a cached artifact or None'''
+    data = read_json(digest_path(name))
+    return data if isinstance(data, dict) and 'sha256' in data else None
+
+def save_digest(name, sha256, signed=False):
+    '''records the checksum of a cached artifact and whether its signature was checked'''
+    write_json(digest_path(name), {'sha256': sha256, 'signed': signed})
+
+def state_path():
+    '''returns the path of the version state (latest known version)'''
+    return _path('state.json')
+
+def load_state():
+    '''returns {'latest': version, 'checked': timestamp} or None'''
+    state = read_json(state_path())
+    return state if isinstance(state, dict) and 'latest' in state else None
+
+def save_state(latest):
+    '''records the latest available version'''
+    write_json(state_path(), {'latest': latest, 'checked': time.time()})
+
+def circuits_path():
+    '''returns the path of the failure records of the endpoints'''
+    return _path('circuits.json')
+
+def load_circuits():
+    '''returns {endpoint: {'failures': n, 'retry': timestamp, 'error': text}}'''
+    circuits = read_json(circuits_path())
+    return circuits if isinstance(circuits, dict) else {}
+
+def save_circuits(circuits):
+    '''records the failures of the endpoints'''
+    write_json(circuits_path(), circuits)
+
+def hot_files_path():
+    '''returns the path of the list of files `aws` reads (see prewarm)'''
+    return _path('hot-files.json')
+
+def manifest_path(version):
+    '''returns the path of the archive manifest of a version'''
+    return _path('manifests', '%s.json' % version)
+
+def load_manifest(version):
+    '''returns {relative path: [size, crc32]} of a version's dist tree or None'''
+    data = read_json(manifest_path(version))
+    return data['files'] if data else None
+
+def save_manifest(version, files):
+    '''stores the archive manifest of a version'''
+    write_json(manifest_path(version), {'version': version, 'files': files})
+
+def fingerprint_path(tree):
+    '''returns the path of the fingerprint cache of an installed tree'''
+    import hashlib  # pylint: disable=import-outside-toplevel
+    key = hashlib.sha1(os.path.abspath(tree).encode('utf-8')).hexdigest()
+    return _path('fingerprints', '%s.json' % key)
@@ -0,0 +1,110 @@
+'''circuit breakers for endpoints that are down
+
+Every endpoint (scheme and host of a URL) that failed with a connection
+error, a timeout or a 5xx/429 answer gets a record in <cache>/circuits.json:
+
+{"https://api.github.com": {"failures": 3, "retry": 1700000000.0,
+                            "error": "ConnectTimeout(...)"}}
+
+Until the retry time the endpoint is skipped without a request (the circuit
+is open). The time grows with the consecutive failures, from BASE_DELAY
+doubling up to MAX_DELAY, with some jitter so the hosts of a fleet do not all
+come back at the same second. The first request after that decides: a
+success removes the record, a failure opens the circuit again for longer.
+When every URL of a request is skipped, Unreachable is raised right away.'''
+
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+from . import cache
+
+BASE_DELAY = 300
+MAX_DELAY = 6 * 3600
+JITTER = 0.1
+
+
+class Unreachable(Exception):
+    '''all endpoints of a request failed recently, none was tried'''
+
+
+def endpoint(url):
+    '''returns the endpoint (scheme://host[:port]) of url'''
+    parts = urlsplit(url)
+    return '%s://%s' % (parts.scheme, parts.netloc)
+
+def delay(failures):
+    '''returns the seconds to skip an endpoint after consecutive failures'''
+    return min(MAX_DELAY, BASE_DELAY * 2 ** (failures - 1))
+
+
+class Circuits:
+    '''the failure records of all endpoints, shared by the threads of a run'''
+    def __init__(self, records=None, ignore=False):
+        self.records = {key: record for key, record in (records or {}).items()
+                        if isinstance(record, dict) and 'failures' in record and 'retry' in record}
+        self.ignore = ignore
+        self.changed = False
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, ignore=False):
+        '''returns the circuits recorded in the cache'''
+        return cls(cache.load_circuits(), ignore)
+
+    def save(self):
+        '''writes the records back to the cache if they changed'''
+        if self.changed:
+            with self.lock:
+                cache.save_circuits(self.records)
+                self.changed = False
+
+    def is_open(self, url, now=None):
+        '''returns True if url is to be skipped'''
+        record = self.records.get(endpoint(url))
+        return bool(record) and not self.ignore and (now or time.time()) < record['retry']
+
+    def allowed(self, urls):
+        '''returns the urls whose circuit is closed, raises Unreachable if there are none'''
+        now = time.time()
+        available = [url for url in urls if not self.is_open(url, now)]
+        if urls and not available:
+            retry = min(self.records[endpoint(url)]['retry'] for url in urls)
+            raise Unreachable('%s failed recently (%s), next try after %s' % (
+                ', '.join(sorted({endpoint(url) for url in urls})),
+                self.records[endpoint(urls[0])].get('error', 'unknown error'),
+                time.strftime('%H:%M:%S', time.localtime(retry))))
+        return available
+
+    def success(self, url):
+        '''closes the circuit of the endpoint of url'''
+        with self.lock:
+            if self.records.pop(endpoint(url), None):
+                self.changed = True
+
+    def failure(self, url, error):
+        '''records a failure of the endpoint of url, opening its circuit'''
+        with self.lock:
+            record = self.records.get(endpoint(url)) or {'failures': 0}
+            failures = record['failures'] + 1
+            wait = delay(failures) * (1 + random.uniform(-JITTER, JITTER))
+            self.records[endpoint(url)] = {
+                'failures': failures,
+                'retry': round(time.time() + wait, 3),
+                'error': repr(error)[:200],
+            }
+            self.changed = True
+
+    def guard(self, url, call, is_outage):
+        '''returns call(), recording the outcome for the endpoint of url
+
+        is_outage(error) tells the errors that count as the endpoint being
+        down, other errors (e.g. a 404) leave its record as it is.'''
+        try:
+            result = call()
+        except Exception as err:  # pylint: disable=broad-except
+            if is_outage(err):
+                self.failure(url, err)
+            raise
+        self.success(url)
+        return result
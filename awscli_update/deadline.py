@@ -0,0 +1,156 @@
+'''`--deadline` and `--timeout PHASE=SECONDS` for unattended runs
+
+The run is split into the phases discovery (current and latest version),
+download, extract and install. A phase ends when its own timeout or the
+overall deadline is reached, whichever comes first.
+
+Where signal.setitimer exists, an interval timer interrupts the main thread
+with DeadlineExceeded wherever it is waiting: in a socket read, in
+subprocess.call (which kills the child on the way out) or in between archive
+members. Temporary directories and staged versions are removed by the
+handlers that are already there for other errors. In addition, the remaining
+time is passed as timeout to requests and subprocess calls, which also bounds
+them where there is no timer (Windows) or outside of the main thread.'''
+
+import contextlib
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+PHASES = ('discovery', 'download', 'extract', 'install')
+# like timeout(1), so monitoring can count it apart from other failures
+EXIT_CODE = 124
+
+
+class DeadlineExceeded(Exception):
+    '''the overall deadline or the timeout of a phase was reached'''
+    def __init__(self, phase, overall=False):
+        if overall:
+            message = 'deadline exceeded during %s' % phase if phase else 'deadline exceeded'
+        else:
+            message = '%s timed out' % phase
+        super().__init__(message)
+        self.phase = phase
+        self.overall = overall
+
+
+def parse_timeout(value):
+    '''returns (phase, seconds) of a PHASE=SECONDS argument'''
+    phase, _, seconds = value.partition('=')
+    if phase not in PHASES:
+        raise ValueError('unknown phase %s, expected one of %s' % (phase, ', '.join(PHASES)))
+    seconds = float(seconds)
+    if seconds <= 0:
+        raise ValueError('timeout must be positive')
+    return phase, seconds
+
+
+def call(command, timeout=None, **kwargs):
+    '''like subprocess.call, but with a timeout kills the whole process group of command
+
+    Installers run helpers of their own, which would otherwise keep running
+    when the installer is killed at the deadline. The group is a new one in
+    the same session, so the terminal stays attached (sudo opens /dev/tty to
+    ask for a password). Without a timeout nothing differs from
+    subprocess.call.'''
+    if timeout is None:
+        return subprocess.call(command, **kwargs)
+    # process_group is new in Python 3.11, older ones kill the command alone
+    grouped = sys.version_info >= (3, 11) and hasattr(os, 'killpg')
+    if grouped:
+        kwargs['process_group'] = 0
+    process = subprocess.Popen(command, **kwargs)  # pylint: disable=consider-using-with
+    try:
+        return process.wait(timeout)
+    except BaseException:
+        try:
+            if grouped:
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+            process.wait()
+        except OSError:
+            # not ours to kill (sudo), it is left running
+            pass
+        raise
+
+class Deadline:
+    '''tracks the time left for the run and its current phase'''
+    def __init__(self, total=None, timeouts=None):
+        self.start = time.monotonic()
+        self.end = self.start + total if total else None
+        self.timeouts = dict(timeouts or {})
+        self.spent = {}
+        self.phase_end = None
+        self.current = None
+
+    def remaining(self):
+        '''returns the seconds left in the current phase, None if unlimited'''
+        ends = [end for end in (self.end, self.phase_end) if end is not None]
+        return min(ends) - time.monotonic() if ends else None
+
+    def timeout(self):
+        '''returns a timeout for a blocking call, raises if the time is up'''
+        remaining = self.remaining()
+        if remaining is None:
+            return None
+        if remaining <= 0:
+            raise self._expired()
+        return remaining
+
+    def check(self):
+        '''raises DeadlineExceeded if the time is up'''
+        self.timeout()
+
+    def _expired(self):
+        # the timer fires a little early at times, the sooner end is the one reached
+        overall = self.end is not None and (self.phase_end is None or self.end <= self.phase_end)
+        return DeadlineExceeded(self.current, overall)
+
+    def _alarm(self, *_):
+        raise self._expired()
+
+    def _arm(self, timer):
+        remaining = self.remaining()
+        if timer and remaining is not None:
+            signal.setitimer(signal.ITIMER_REAL, max(remaining, 0.001))
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        '''runs the block as phase name, raising DeadlineExceeded when time is up
+
+        The timeout of a phase covers all of its blocks together. In other
+        threads the block only runs within the phase of the main thread.'''
+        if threading.current_thread() is not threading.main_thread():
+            try:
+                self.check()
+                yield
+            except subprocess.TimeoutExpired as err:
+                raise self._expired() from err
+            return
+        outer = (self.current, self.phase_end)
+        self.current = name
+        start = time.monotonic()
+        if name in self.timeouts:
+            end = start + self.timeouts[name] - self.spent.get(name, 0)
+            self.phase_end = min(end, outer[1]) if outer[1] is not None else end
+        timer = hasattr(signal, 'setitimer') and self.remaining() is not None
+        previous = signal.signal(signal.SIGALRM, self._alarm) if timer else None
+        try:
+            self.check()
+            self._arm(timer)
+            yield
+        except subprocess.TimeoutExpired as err:
+            raise self._expired() from err
+        finally:
+            if timer:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, previous)
+            self.spent[name] = self.spent.get(name, 0) + time.monotonic() - start
+            self.current, self.phase_end = outer
+            if timer and outer[0] is not None:
+                # the enclosing phase keeps running with its own limit
+                self._arm(True)
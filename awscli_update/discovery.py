@@ -0,0 +1,108 @@
+'''find the latest AWS CLI version by racing several sources
+
+tags       the GitHub tags API (or the mirrors serving its answer)
+atom       the Atom feed of the repository's tags
+changelog  the head of CHANGELOG.rst on the v2 branch
+
+All configured sources are queried at once and the first valid answer wins.
+Every source has its own timeout; stragglers run in daemon threads and are
+abandoned instead of being waited for.
+
+The answers are small, so they are fetched with urllib: importing requests
+would take longer than the whole lookup. Certificates are checked against
+the same CA bundle (certifi) requests uses.'''
+
+import functools
+import json
+import re
+import ssl
+import urllib.error
+import urllib.request
+from xml.etree import ElementTree
+from . import circuit, endpoints
+
+VERSION_REGEX = re.compile(r'([0-9]+)\.([0-9]+)\.([0-9]+)')
+CHANGELOG_REGEX = re.compile(rb'^(2\.[0-9]+\.[0-9]+)\r?\n=+\s*$', re.MULTILINE)
+ATOM_TITLE = '{http://www.w3.org/2005/Atom}entry/{http://www.w3.org/2005/Atom}title'
+# the newest release is at the top, no need to fetch the whole file
+CHANGELOG_RANGE = 'bytes=0-16383'
+
+
+def parse_tags(content):
+    '''returns the newest version of a GitHub tags API answer'''
+    version = json.loads(content)[0]['name']
+    return version if VERSION_REGEX.match(version) else None
+
+def parse_atom(content):
+    '''returns the newest v2 version of an Atom feed of tags'''
+    titles = (entry.text or '' for entry in ElementTree.fromstring(content).iterfind(ATOM_TITLE))
+    versions = [title.strip() for title in titles
+                if VERSION_REGEX.fullmatch(title.strip()) and title.strip().startswith('2.')]
+    return max(versions, key=lambda v: tuple(map(int, v.split('.'))), default=None)
+
+def parse_changelog(content):
+    '''returns the first version heading of CHANGELOG.rst'''
+    match = CHANGELOG_REGEX.search(content)
+    return match.group(1).decode('ascii') if match else None
+
+PARSERS = {
+    'tags': parse_tags,
+    'atom': parse_atom,
+    'changelog': parse_changelog,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _ssl_context():
+    try:
+        import certifi  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return ssl.create_default_context()
+    return ssl.create_default_context(cafile=certifi.where())
+
+def _get(url, headers, timeout):
+    '''returns the body of a successful GET, raises OSError otherwise'''
+    request = urllib.request.Request(url, headers=headers)
+    with urllib.request.urlopen(request, timeout=timeout, context=_ssl_context()) as result:
+        return result.read()
+
+def _query(source, url, timeout):
+    headers = {'Range': CHANGELOG_RANGE} if source == 'changelog' else {}
+    version = PARSERS[source](_get(url, headers, timeout))
+    if not version:
+        raise ValueError('no version found in %s' % url)
+    return version
+
+def _is_outage(err):
+    if isinstance(err, urllib.error.HTTPError):
+        return err.code >= 500 or err.code == 429
+    return isinstance(err, OSError)
+
+def _query_source(config, source, urls, circuits=None):
+    def query(url):
+        if circuits:
+            return circuits.guard(
+                url, lambda: _query(source, url, config.timeouts[source]), _is_outage)
+        return _query(source, url, config.timeouts[source])
+    return endpoints.hedged([lambda url=url: query(url) for url in urls], config.hedge_delay)
+
+def latest_version(config, circuits=None):
+    '''returns the latest version string reported by the fastest source
+
+    Raises the last error if no source gave a valid answer, and
+    circuit.Unreachable without a request if the endpoints of all sources
+    are down (see circuit).'''
+    sources = {}
+    error = None
+    for source in config.version_sources:
+        urls = config.source_urls(source)
+        try:
+            sources[source] = circuits.allowed(urls) if circuits else urls
+        except circuit.Unreachable as err:
+            error = err
+    if not sources:
+        raise error
+    return endpoints.hedged(
+        [lambda source=source, urls=urls: _query_source(config, source, urls, circuits)
+         for source, urls in sources.items()],
+        delay=0)
@@ -0,0 +1,131 @@
+'''single-pass verification of installer artifacts while they are downloaded
+
+Every chunk is written to the cache file, added to a SHA-256 and, with a
+detached PGP signature, piped into `gpg --verify` right away. The result is
+known when the last chunk arrives, without reading the file a second time,
+and a file failing verification never ends up in the cache.'''
+
+import os
+import subprocess
+import tempfile
+
+CHUNK_SIZE = 1 << 20
+
+
+class VerificationError(Exception):
+    '''an artifact did not match the expected checksum or its signature'''
+
+
+class _Signature:
+    '''checks a detached signature with gpg reading the data from a pipe'''
+    def __init__(self, signature, name):
+        self.name = name
+        fd, self.path = tempfile.mkstemp(suffix='.sig')
+        with os.fdopen(fd, 'wb') as file:
+            file.write(signature)
+        # gpg output goes to a file, a full pipe would block its stdin
+        self.log = tempfile.TemporaryFile()
+        try:
+            self.process = subprocess.Popen(
+                ['gpg', '--batch', '--no-tty', '--verify', self.path, '-'],
+                stdin=subprocess.PIPE, stdout=self.log, stderr=subprocess.STDOUT)
+        except OSError as err:
+            self._cleanup()
+            raise VerificationError('cannot run gpg: %s' % err) from err
+        self.broken = False
+
+    def update(self, chunk):
+        '''passes data on to gpg'''
+        if self.broken:
+            return
+        try:
+            self.process.stdin.write(chunk)
+        except BrokenPipeError:
+            # gpg gave up early, its exit status tells why
+            self.broken = True
+
+    def finish(self):
+        '''waits for gpg, raises VerificationError if the signature is bad'''
+        try:
+            try:
+                self.process.stdin.close()
+            except BrokenPipeError:
+                pass
+            if self.process.wait() != 0:
+                self.log.seek(0)
+                output = self.log.read().decode('utf-8', 'replace').strip()
+                raise VerificationError('bad signature of %s: %s' % (self.name, output))
+        finally:
+            self._cleanup()
+
+    def abort(self):
+        '''stops gpg'''
+        self.process.kill()
+        self.process.wait()
+        self._cleanup()
+
+    def _cleanup(self):
+        self.log.close()
+        os.remove(self.path)
+
+
+class Verifier:
+    '''computes the SHA-256 (and checks the signature) of data passed in chunks'''
+    def __init__(self, name, sha256=None, signature=None):
+        self.name = name
+        self.expected = sha256
+        # hashlib loads OpenSSL, which only pays off when there is a download
+        import hashlib  # pylint: disable=import-outside-toplevel
+        self.digest = hashlib.sha256()
+        self.signature = _Signature(signature, name) if signature is not None else None
+
+    def update(self, chunk):
+        '''adds a chunk of the artifact'''
+        self.digest.update(chunk)
+        if self.signature:
+            self.signature.update(chunk)
+
+    def finish(self):
+        '''returns the hex SHA-256, raises VerificationError on a mismatch'''
+        if self.signature:
+            self.signature.finish()
+        digest = self.digest.hexdigest()
+        check_digest(self.name, digest, self.expected)
+        return digest
+
+    def abort(self):
+        '''gives up verification (e.g. when the download failed)'''
+        if self.signature:
+            self.signature.abort()
+
+
+def check_digest(name, digest, expected):
+    '''raises VerificationError if expected digests are given and digest is none of them'''
+    expected = {value.lower() for value in expected or ()}
+    if expected and digest not in expected:
+        raise VerificationError('SHA-256 of %s is %s, expected %s' %
+                                (name, digest, ' or '.join(sorted(expected))))
+
+def save(chunks, file, name, sha256=None, signature=None):
+    '''writes chunks to file while verifying them, returns the hex SHA-256'''
+    verifier = Verifier(name, sha256, signature)
+    try:
+        for chunk in chunks:
+            file.write(chunk)
+            verifier.update(chunk)
+    except BaseException:
+        verifier.abort()
+        raise
+    return verifier.finish()
+
+def check_file(path, sha256=None, signature=None, chunk_size=CHUNK_SIZE):
+    '''verifies a file downloaded earlier, returns its hex SHA-256'''
+    verifier = Verifier(os.path.basename(path), sha256, signature)
+    try:
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(chunk_size), b''):
+                verifier.update(chunk)
+    except BaseException:
+        verifier.abort()
+        raise
+    return verifier.finish()
@@ -0,0 +1,225 @@
+'''where to find the tags answer and the installer artifacts
+
+Every endpoint is a list of URLs (templates with a `{version}` placeholder for
+artifacts) in order of preference. They are taken from, later ones winning:
+
+- the built-in defaults (GitHub and awscli.amazonaws.com)
+- the `[endpoints]` section of the config file (`--config`,
+  $AWSCLI_UPDATE_CONFIG or ~/.config/awscli-update/config.ini)
+- environment variables AWSCLI_UPDATE_TAGS_URL and
+  AWSCLI_UPDATE_<KEY>_URL, e.g. AWSCLI_UPDATE_LINUX_AARCH64_URL
+- the `--mirror`, `--tags-url` and `--artifact-url` options
+
+The latest version is looked up from the sources in `version-sources`
+(tags, atom, changelog; see discovery), each with a `<source>-timeout`.
+
+Lists of URLs are whitespace separated. With several URLs the requests are
+hedged: the next URL is tried when the previous one did not answer within the
+hedge delay (or failed), and the first good response wins.'''
+
+import configparser
+import os
+import queue
+import re
+import sys
+import threading
+
+TAGS_PATH = '/repos/aws/aws-cli/tags'
+TAGS_URL = 'https://api.github.com' + TAGS_PATH
+ARTIFACTS_URL = 'https://awscli.amazonaws.com'
+ARTIFACTS = {
+    'linux-x86_64': ARTIFACTS_URL + '/awscli-exe-linux-x86_64-{version}.zip',
+    'linux-aarch64': ARTIFACTS_URL + '/awscli-exe-linux-aarch64-{version}.zip',
+    'darwin': ARTIFACTS_URL + '/AWSCLIV2-{version}.pkg',
+    'win32': ARTIFACTS_URL + '/AWSCLIV2-{version}.msi',
+}
+ATOM_URL = 'https://github.com/aws/aws-cli/tags.atom'
+CHANGELOG_URL = 'https://raw.githubusercontent.com/aws/aws-cli/v2/CHANGELOG.rst'
+VERSION_SOURCES = ('tags', 'atom', 'changelog')
+SOURCE_TIMEOUTS = {'tags': 5.0, 'atom': 5.0, 'changelog': 5.0}
+HEDGE_DELAY = 0.5
+SECTION = 'endpoints'
+
+
+def platform_key():
+    '''returns the artifact key of this host, e.g. linux-x86_64'''
+    if sys.platform != 'linux':
+        return sys.platform
+    machine = os.uname().machine.lower()
+    return 'linux-aarch64' if machine in ('aarch64', 'arm64') else 'linux-x86_64'
+
+def config_path():
+    '''returns the default config file location'''
+    path = os.environ.get('AWSCLI_UPDATE_CONFIG')
+    if not path:
+        base = os.environ.get('XDG_CONFIG_HOME') or os.path.expanduser('~/.config')
+        path = os.path.join(base, 'awscli-update', 'config.ini')
+    return path
+
+
+class Endpoints:
+    '''URLs of the tags answer and installer artifacts, in order of preference'''
+    def __init__(self, tags=None, artifacts=None, hedge_delay=HEDGE_DELAY):
+        self.tags = tags or [TAGS_URL]
+        self.artifacts = {key: [url] for key, url in ARTIFACTS.items()}
+        self.artifacts.update(artifacts or {})
+        self.hedge_delay = hedge_delay
+        self.atom = [ATOM_URL]
+        self.changelog = [CHANGELOG_URL]
+        self.version_sources = list(VERSION_SOURCES)
+        self.timeouts = dict(SOURCE_TIMEOUTS)
+
+    def source_urls(self, source):
+        '''returns the URLs of a version source'''
+        return {'tags': self.tags, 'atom': self.atom, 'changelog': self.changelog}[source]
+
+    def set_mirrors(self, mirrors):
+        '''serves everything from the given mirrors (e.g. `awscli-update serve`)'''
+        mirrors = [mirror.rstrip('/') for mirror in mirrors]
+        self.tags = [mirror + TAGS_PATH for mirror in mirrors]
+        # a mirror is usually there because GitHub is slow or unreachable
+        self.version_sources = ['tags']
+        self.artifacts = {
+            key: ['%s/%s' % (mirror, url.rsplit('/', 1)[1]) for mirror in mirrors]
+            for key, url in ARTIFACTS.items()}
+
+    def artifact_urls(self, version, key=None):
+        '''returns the URLs of the installer of version for key (default: this host)'''
+        return [url.format(version=version)
+                for url in self.artifacts[key or platform_key()]]
+
+    def artifact_name(self, version, key=None):
+        '''returns the file name of the installer of version'''
+        return self.artifact_urls(version, key)[0].rsplit('/', 1)[1]
+
+    def urls_for_name(self, name):
+        '''returns the URLs of an artifact (or its .sig) known by file name'''
+        base, suffix = (name[:-4], '.sig') if name.endswith('.sig') else (name, '')
+        match = re.search(r'-([0-9]+\.[0-9]+\.[0-9]+)\.', base)
+        if not match:
+            return []
+        urls = (url.format(version=match.group(1))
+                for templates in self.artifacts.values() for url in templates)
+        return [url + suffix for url in urls if url.rsplit('/', 1)[1] == base]
+
+
+def _split(value):
+    return value.split() if value else None
+
+def load(args):
+    '''returns the endpoints configured by defaults, config file, environment and args'''
+    endpoints = Endpoints()
+    parser = configparser.ConfigParser()
+    parser.read(args.config or config_path())
+    if parser.has_section(SECTION):
+        section = parser[SECTION]
+        if section.get('mirror'):
+            endpoints.set_mirrors(_split(section['mirror']))
+        endpoints.tags = _split(section.get('tags')) or endpoints.tags
+        for key in ARTIFACTS:
+            endpoints.artifacts[key] = _split(section.get(key)) or endpoints.artifacts[key]
+        endpoints.atom = _split(section.get('atom')) or endpoints.atom
+        endpoints.changelog = _split(section.get('changelog')) or endpoints.changelog
+        endpoints.version_sources = (_split(section.get('version-sources'))
+                                     or endpoints.version_sources)
+        for source in VERSION_SOURCES:
+            endpoints.timeouts[source] = section.getfloat(
+                '%s-timeout' % source, endpoints.timeouts[source])
+        endpoints.hedge_delay = section.getfloat('hedge-delay', endpoints.hedge_delay)
+    environ = os.environ
+    if environ.get('AWSCLI_UPDATE_MIRROR'):
+        endpoints.set_mirrors(_split(environ['AWSCLI_UPDATE_MIRROR']))
+    endpoints.tags = _split(environ.get('AWSCLI_UPDATE_TAGS_URL')) or endpoints.tags
+    for key in ARTIFACTS:
+        variable = 'AWSCLI_UPDATE_%s_URL' % key.upper().replace('-', '_')
+        endpoints.artifacts[key] = _split(environ.get(variable)) or endpoints.artifacts[key]
+    if args.mirrors:
+        endpoints.set_mirrors(args.mirrors)
+    endpoints.tags = args.tags_urls or endpoints.tags
+    if args.artifact_urls:
+        endpoints.artifacts[platform_key()] = args.artifact_urls
+    if args.version_sources:
+        endpoints.version_sources = args.version_sources
+    if args.hedge_delay is not None:
+        endpoints.hedge_delay = args.hedge_delay
+    return endpoints
+
+
+def hedged(calls, delay=HEDGE_DELAY, discard=None):
+    '''returns the result of the first call that succeeds
+
+    The calls are started delay seconds apart, or right away when all running
+    ones failed. They run in daemon threads, so a hanging straggler never
+    delays the exit; results of calls completing after the winner are passed
+    to discard (e.g. to close a response). Raises the last error if all fail.'''
+    if len(calls) == 1:
+        return calls[0]()
+    results = queue.Queue()
+    lock = threading.Lock()
+    finished = []
+
+    def run(call):
+        try:
+            outcome = (True, call())
+        except Exception as err:  # pylint: disable=broad-except
+            outcome = (False, err)
+        with lock:
+            if not finished:
+                results.put(outcome)
+                return
+        if outcome[0] and discard:
+            discard(outcome[1])
+
+    remaining = list(calls)
+    running = 0
+    error = None
+    try:
+        while remaining or running:
+            if remaining:
+                threading.Thread(target=run, args=(remaining.pop(0),), daemon=True).start()
+                running += 1
+            try:
+                success, value = results.get(timeout=delay if remaining else None)
+            except queue.Empty:
+                continue
+            running -= 1
+            if success:
+                return value
+            error = value
+        raise error
+    finally:
+        with lock:
+            finished.append(True)
+            while not results.empty():
+                success, value = results.get_nowait()
+                if success and discard:
+                    discard(value)
+
+
+def fetch(urls, delay=HEDGE_DELAY, circuits=None, **kwargs):
+    '''returns the streamed response of the first URL answering successfully
+
+    With circuits (see circuit), URLs of endpoints that are down are skipped.'''
+    # requests takes longer to import than everything else, load it on demand
+    import requests  # pylint: disable=import-outside-toplevel
+
+    def get(url):
+        result = requests.get(url, allow_redirects=True, stream=True, **kwargs)
+        try:
+            result.raise_for_status()
+        except requests.HTTPError:
+            result.close()
+            raise
+        return result
+
+    def is_outage(err):
+        if isinstance(err, requests.HTTPError):
+            return err.response is not None and \
+                (err.response.status_code >= 500 or err.response.status_code == 429)
+        return isinstance(err, (requests.ConnectionError, requests.Timeout))
+    if circuits:
+        calls = [lambda url=url: circuits.guard(url, lambda: get(url), is_outage)
+                 for url in circuits.allowed(urls)]
+    else:
+        calls = [lambda url=url: get(url) for url in urls]
+    return hedged(calls, delay, discard=lambda result: result.close())
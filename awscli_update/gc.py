@@ -0,0 +1,95 @@
+'''retention policy for old version directories below <install-dir>/v2'''
+
+import os
+import time
+from . import background, layout
+
+TRASH_PREFIX = '.trash-'
+UNLINK_WORKERS = 8
+
+
+def expired_versions(install, keep=None, keep_days=None, now=None):
+    '''returns the versions the policy removes, never including `current`
+
+    A version is kept if it is among the keep newest versions or if its
+    directory is younger than keep_days; an unset limit keeps nothing.'''
+    if keep is None and keep_days is None:
+        return []
+    versions_dir = '%s/v2' % install
+    try:
+        names = [name for name in os.listdir(versions_dir) if layout.is_version(name)]
+    except FileNotFoundError:
+        return []
+    current = layout.current_version(install)
+    now = now or time.time()
+    newest_first = sorted(names, key=layout.version_key, reverse=True)
+    expired = []
+    for index, version in enumerate(newest_first):
+        if version == current:
+            continue
+        if keep is not None and index < keep:
+            continue
+        if keep_days is not None:
+            age = now - os.lstat(os.path.join(versions_dir, version)).st_mtime
+            if age < keep_days * 86400:
+                continue
+        expired.append(version)
+    return expired
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+def remove_tree(path, workers=UNLINK_WORKERS):
+    '''deletes a directory tree, unlinking its files in parallel
+
+    Entries that are already gone are skipped: two gc runs may remove the
+    leftovers of an interrupted one at the same time.'''
+    files = []
+    dirs = []
+    for root, dirnames, filenames in os.walk(path, topdown=False):
+        files.extend(os.path.join(root, name) for name in filenames)
+        # symlinks to directories show up in dirnames but are files to unlink
+        for name in dirnames:
+            entry = os.path.join(root, name)
+            if os.path.islink(entry):
+                files.append(entry)
+        dirs.append(root)
+    from concurrent.futures import ThreadPoolExecutor  # pylint: disable=import-outside-toplevel
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(_unlink, files, chunksize=64))
+    for directory in dirs:
+        try:
+            os.rmdir(directory)
+        except FileNotFoundError:
+            pass
+
+def collect(install, keep=None, keep_days=None):
+    '''removes expired versions and leftovers of interrupted collections'''
+    versions_dir = '%s/v2' % install
+    removed = []
+    if not os.path.isdir(versions_dir):
+        return removed
+    # an install running now must not have its new version taken away
+    with layout.locked(install):
+        for version in expired_versions(install, keep, keep_days):
+            # hide the directory first so it is never seen half deleted
+            trash = os.path.join(versions_dir, '%s%s-%d' % (TRASH_PREFIX, version, os.getpid()))
+            os.rename(os.path.join(versions_dir, version), trash)
+            removed.append(version)
+    for name in os.listdir(versions_dir):
+        if name.startswith(TRASH_PREFIX):
+            remove_tree(os.path.join(versions_dir, name))
+    return removed
+
+def spawn(prefix=None, keep=None, keep_days=None, sudo=False, root=None):
+    '''runs `awscli-update gc` detached from this process at idle priority'''
+    arguments = ['--root', os.path.abspath(root)] if root else []
+    arguments.append('gc')
+    if keep is not None:
+        arguments += ['--keep', str(keep)]
+    if keep_days is not None:
+        arguments += ['--keep-days', str(keep_days)]
+    background.spawn(arguments, prefix, sudo)
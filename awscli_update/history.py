@@ -0,0 +1,209 @@
+'''run history for `awscli-update stats`
+
+Every run appends one compact JSON line to <cache>/history/runs.jsonl:
+
+{"time":..., "command":"update", "outcome":"installed", "exit":0,
+ "duration":1.92, "phases":{"check":0.21,"download":1.1,...},
+ "bytes":61234567, "cache_hit":false, "throughput":55667788,
+ "current":"2.15.1", "target":"2.15.2"}
+
+When the file grows beyond MAX_BYTES it is rotated to runs.1.jsonl (the
+previous one is dropped), which keeps well over a year of hourly runs. The
+time is always the first key, so old records are skipped without decoding.'''
+
+import contextlib
+import json
+import os
+import time
+from . import cache
+
+MAX_BYTES = 4 << 20
+PERCENTILES = (50, 90, 99)
+WINDOWS = ((1, '24h'), (7, '7d'), (30, '30d'))
+DAY = 86400
+# the runs the windows and the phase table are about, other commands are only counted
+UPDATES = ('update', 'noop')
+FAILURES = ('failed', 'error', 'check-failed', 'offline', 'verification-failed', 'timeout',
+            'unreachable', 'download-failed')
+
+
+def history_path(generation=0):
+    '''returns the path of the current (0) or rotated (1) history file'''
+    name = 'runs.jsonl' if not generation else 'runs.%d.jsonl' % generation
+    return os.path.join(cache.cache_dir(), 'history', name)
+
+
+class Run:
+    '''collects the phase durations, transferred bytes and outcome of one run'''
+    def __init__(self, command):
+        self.start = time.time()
+        self.clock = time.perf_counter()
+        self.command = command
+        self.phases = {}
+        self.nested = []
+        self.bytes = 0
+        self.cache_hit = None
+        self.throughput = None
+        self.pressure = None
+        self.versions = {}
+        self.outcome = None
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        '''adds the time spent in the block to the phase
+
+        Phases inside of it (e.g. the download of an install) count only for
+        themselves, so the phases add up to no more than the run.'''
+        start = time.perf_counter()
+        self.nested.append(0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            inner = self.nested.pop()
+            if self.nested:
+                self.nested[-1] += elapsed
+            self.phases[name] = self.phases.get(name, 0) + elapsed - inner
+
+    def count(self, chunks):
+        '''passes chunks through, counting their bytes as transferred'''
+        for chunk in chunks:
+            self.bytes += len(chunk)
+            yield chunk
+
+    def set_versions(self, current=None, target=None):
+        '''records the installed and the wanted version'''
+        if current:
+            self.versions['current'] = current
+        if target:
+            self.versions['target'] = target
+
+    def record(self, exit_code):
+        '''returns the history record, exit_code None meaning the run crashed'''
+        outcome = self.outcome
+        if not outcome:
+            outcome = 'error' if exit_code is None else 'ok' if exit_code == 0 else 'failed'
+        record = {
+            'time': round(self.start, 3),
+            'command': self.command,
+            'outcome': outcome,
+            'exit': exit_code,
+            'duration': round(time.perf_counter() - self.clock, 4),
+            'phases': {name: round(value, 4) for name, value in self.phases.items()},
+        }
+        if self.bytes:
+            record['bytes'] = self.bytes
+        if self.cache_hit is not None:
+            record['cache_hit'] = self.cache_hit
+        if self.throughput:
+            record['throughput'] = round(self.throughput)
+        if self.pressure is not None:
+            record['pressure'] = self.pressure
+        record.update(self.versions)
+        return record
+
+
+def append(record):
+    '''appends a record to the history, rotating it when it is too large'''
+    path = history_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        if os.path.getsize(path) > MAX_BYTES:
+            os.replace(path, history_path(1))
+    except FileNotFoundError:
+        pass
+    line = json.dumps(record, separators=(',', ':')) + '\n'
+    # a single O_APPEND write keeps lines of concurrent runs whole
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode('utf-8'))
+    finally:
+        os.close(fd)
+
+def _time_of(line):
+    # lines start with {"time":<timestamp>,
+    try:
+        return float(line[8:line.index(b',')])
+    except ValueError:
+        return None
+
+def load(since=0):
+    '''returns the records since the given timestamp, oldest first'''
+    records = []
+    for path in (history_path(1), history_path()):
+        try:
+            file = open(path, 'rb')  # pylint: disable=consider-using-with
+        except FileNotFoundError:
+            continue
+        with file:
+            for line in file:
+                timestamp = _time_of(line)
+                if timestamp is None or timestamp < since:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    pass
+    return records
+
+
+def percentile(values, percent):
+    '''returns the nearest-rank percentile of sorted values'''
+    rank = max(0, -(-len(values) * percent // 100) - 1)
+    return values[int(rank)]
+
+def _seconds(value):
+    return '%.2fs' % value if value < 100 else '%.0fs' % value
+
+def _rate(part, whole):
+    return '%d/%d (%.0f%%)' % (part, whole, 100.0 * part / whole) if whole else '-'
+
+def summarize(records, now=None):
+    '''returns the lines of the stats report for records
+
+    Windows, cache hits and phases cover the update and noop runs, runs of
+    other commands (verify, rollback, ...) are only counted.'''
+    now = now or time.time()
+    lines = []
+    others = {}
+    for record in records:
+        if record['command'] not in UPDATES:
+            others[record['command']] = others.get(record['command'], 0) + 1
+    records = [record for record in records if record['command'] in UPDATES]
+    for days, label in WINDOWS:
+        window = [record for record in records if record['time'] >= now - days * DAY]
+        durations = sorted(record['duration'] for record in window)
+        failed = sum(1 for record in window if record['outcome'] in FAILURES)
+        deferred = sum(1 for record in window if record['outcome'] == 'deferred')
+        lines.append('%-4s %5d runs, failed %s, deferred %d, median %s' % (
+            label, len(window), _rate(failed, len(window)), deferred,
+            _seconds(percentile(durations, 50)) if durations else '-'))
+    lookups = [record for record in records if 'cache_hit' in record]
+    hits = sum(1 for record in lookups if record['cache_hit'])
+    transferred = sum(record.get('bytes', 0) for record in records)
+    lines.append('installer cache hits %s, downloaded %.1f MiB' % (
+        _rate(hits, len(lookups)), transferred / (1 << 20)))
+    throughputs = sorted(record['throughput'] for record in records if 'throughput' in record)
+    if throughputs:
+        lines.append('download throughput p50 %.1f MiB/s, p10 %.1f MiB/s' % (
+            percentile(throughputs, 50) / (1 << 20), percentile(throughputs, 10) / (1 << 20)))
+    if others:
+        lines.append('other commands: %s' % ', '.join(
+            '%s %d' % item for item in sorted(others.items())))
+    lines.append('')
+    phases = {}
+    for record in records:
+        for name, value in record['phases'].items():
+            phases.setdefault(name, []).append(value)
+    phases['total'] = [record['duration'] for record in records]
+    lines.append('%-10s %6s' % ('phase', 'runs') +
+                 ''.join('%9s' % ('p%d' % percent) for percent in PERCENTILES) + '%9s' % 'max')
+    for name, values in phases.items():
+        if not values:
+            continue
+        values.sort()
+        lines.append('%-10s %6d' % (name, len(values)) +
+                     ''.join('%9s' % _seconds(percentile(values, percent))
+                             for percent in PERCENTILES) +
+                     '%9s' % _seconds(values[-1]))
+    return lines
@@ -0,0 +1,123 @@
+'''pluggable inflate backends for extracting the installer archive
+
+isal (igzip) and zlib-ng inflate considerably faster than the stdlib zlib and
+are used when their Python bindings are installed (`pip install isal` or
+`pip install zlib-ng`). All backends implement the same raw deflate format,
+and every member is checked against the CRC-32 of the archive, so the
+extracted files are byte-identical whichever backend is used.'''
+
+import importlib
+import os
+import struct
+import zlib
+from zipfile import BadZipFile, ZIP_DEFLATED, ZIP_STORED
+
+BACKENDS = {
+    'isal': 'isal.isal_zlib',
+    'zlib-ng': 'zlib_ng.zlib_ng',
+    'zlib': 'zlib',
+}
+CHOICES = ('auto', *BACKENDS)
+CHUNK_SIZE = 1 << 20
+LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+LOCAL_HEADER_MAGIC = b'PK\003\004'
+ENCRYPTED = 0x1
+
+
+def load(name='auto'):
+    '''returns the zlib compatible module of a backend
+
+    auto picks the fastest installed one; a named backend that is not
+    installed raises ImportError.'''
+    if name != 'auto':
+        return importlib.import_module(BACKENDS[name])
+    for module in BACKENDS.values():
+        try:
+            return importlib.import_module(module)
+        except ImportError:
+            pass
+    return zlib
+
+def name_of(backend):
+    '''returns the backend name of a module returned by load'''
+    for name, module in BACKENDS.items():
+        if backend.__name__ == module:
+            return name
+    return backend.__name__
+
+
+def _inflate(inflater, chunk, chunk_size):
+    '''yields the data inflated from chunk in pieces of at most chunk_size'''
+    while True:
+        data = inflater.decompress(chunk, chunk_size)
+        if data:
+            yield data
+        chunk = inflater.unconsumed_tail
+        if not chunk and len(data) < chunk_size:
+            return
+
+
+class Reader:
+    '''reads the raw (compressed) data of archive members
+
+    Uses its own file handle if the archive is a file, so several readers
+    can work on one archive concurrently.'''
+    def __init__(self, zipfile):
+        self.zipfile = zipfile
+        if zipfile.filename and os.path.isfile(zipfile.filename):
+            self.file = open(zipfile.filename, 'rb')
+            self.own_file = True
+        else:
+            self.file = zipfile.fp
+            self.own_file = False
+
+    def close(self):
+        '''closes the file handle if it is owned by the reader'''
+        if self.own_file:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def raw_chunks(self, info, chunk_size=CHUNK_SIZE):
+        '''yields the compressed data of a member'''
+        self.file.seek(info.header_offset)
+        header = LOCAL_HEADER.unpack(self.file.read(LOCAL_HEADER.size))
+        if header[0] != LOCAL_HEADER_MAGIC:
+            raise BadZipFile('bad local file header of %s' % info.filename)
+        self.file.seek(header[10] + header[11], os.SEEK_CUR)
+        remaining = info.compress_size
+        while remaining:
+            chunk = self.file.read(min(chunk_size, remaining))
+            if not chunk:
+                raise BadZipFile('truncated data of %s' % info.filename)
+            remaining -= len(chunk)
+            yield chunk
+
+    def chunks(self, info, backend=zlib, chunk_size=CHUNK_SIZE):
+        '''yields the uncompressed data of a member, checking size and CRC-32
+
+        No chunk is larger than chunk_size, however well the data compresses.'''
+        if info.flag_bits & ENCRYPTED or info.compress_type not in (ZIP_STORED, ZIP_DEFLATED):
+            # rare cases are left to the zipfile module
+            with self.zipfile.open(info) as src:
+                yield from iter(lambda: src.read(chunk_size), b'')
+            return
+        crc = 0
+        size = 0
+        inflater = backend.decompressobj(-15) if info.compress_type == ZIP_DEFLATED else None
+        for chunk in self.raw_chunks(info, chunk_size):
+            for data in _inflate(inflater, chunk, chunk_size) if inflater else (chunk,):
+                crc = backend.crc32(data, crc)
+                size += len(data)
+                yield data
+        if inflater:
+            chunk = inflater.flush()
+            crc = backend.crc32(chunk, crc)
+            size += len(chunk)
+            yield chunk
+        if size != info.file_size or crc != info.CRC:
+            raise BadZipFile('bad CRC-32 or size of %s' % info.filename)
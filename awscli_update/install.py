@@ -0,0 +1,249 @@
+'''native installer creating the same layout as the bundled `aws/install`
+
+<install-dir>/v2/<version>/dist/...       extracted aws/dist of the archive
+<install-dir>/v2/<version>/bin/aws       -> ../dist/aws
+<install-dir>/v2/current                 -> <install-dir>/v2/<version>
+<bin-dir>/aws                            -> <install-dir>/v2/current/bin/aws
+
+Every file is written exactly once, straight from the archive into its final
+place, and all symlinks are switched with an atomic rename.
+
+A staged install builds the version directory under a hidden name next to
+the final one, fsyncs and verifies it and only then renames it into place,
+so `current` never points at a partially written tree.
+
+Installs hold a lock on <install-dir>/v2/.lock, so the stages and version
+directories a run removes are never those of a concurrent run.
+
+Installs into a root directory (an unpacked container rootfs or chroot) write
+below the root, but point all symlinks at the paths seen inside of it.'''
+
+import os
+import shutil
+import subprocess
+import tempfile
+from . import inflate, layout, profiling, verify
+
+DIST_PREFIX = 'aws/dist/'
+EXECUTABLES = ('aws', 'aws_completer')
+CHUNK_SIZE = 1 << 20
+FICLONE = 0x40049409
+CLONE_MODES = ('auto', 'reflink', 'hardlink', 'copy')
+
+
+def replace_symlink(target, link, sudo=False):
+    '''atomically (re)points link at target'''
+    tmp = '%s.tmp-%d' % (link, os.getpid())
+    if sudo:
+        # mv -T renames over the old link just like os.replace
+        profiling.run(subprocess.check_call, ['sudo', 'ln', '-sfn', target, tmp])
+        profiling.run(subprocess.check_call, ['sudo', 'mv', '-Tf', tmp, link])
+        return
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+    os.symlink(target, tmp)
+    os.replace(tmp, link)
+
+def _member_path(dest, name):
+    path = os.path.normpath(os.path.join(dest, name))
+    if not path.startswith(dest + os.sep):
+        raise ValueError('refusing to extract %s outside of %s' % (name, dest))
+    return path
+
+def fsync_path(path):
+    '''flushes a file or directory to disk'''
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def fsync_dirs(path):
+    '''flushes all directories below (and including) path to disk'''
+    for root, _, _ in os.walk(path):
+        fsync_path(root)
+
+def extract_members(zipfile, dest, prefix='', fsync=False, backend=None,
+                    chunk_size=CHUNK_SIZE, throttle=None):
+    '''extracts the archive members below prefix into dest, all executable
+
+    A throttle (see background.Throttle) limits the write rate.'''
+    dest = os.path.abspath(dest)
+    backend = backend or inflate.load()
+    with inflate.Reader(zipfile) as reader:
+        for info in zipfile.infolist():
+            if not info.filename.startswith(prefix):
+                continue
+            path = _member_path(dest, info.filename[len(prefix):])
+            if info.is_dir():
+                os.makedirs(path, exist_ok=True)
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as dst:
+                chunks = reader.chunks(info, backend, chunk_size)
+                for chunk in throttle.limit(chunks) if throttle else chunks:
+                    dst.write(chunk)
+                os.fchmod(dst.fileno(), 0o755)
+                if fsync:
+                    os.fsync(dst.fileno())
+
+def extract_dist(zipfile, dest, fsync=False, backend=None, chunk_size=CHUNK_SIZE,
+                 throttle=None):
+    '''extracts aws/dist of the archive into dest'''
+    extract_members(zipfile, dest, DIST_PREFIX, fsync, backend, chunk_size, throttle)
+
+def _reflink(src, dst):
+    import fcntl  # pylint: disable=import-outside-toplevel
+    with open(src, 'rb') as source, open(dst, 'wb') as target:
+        fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+
+def clone_file(src, dst, mode='auto', throttle=None, chunk_size=CHUNK_SIZE):
+    '''creates dst with the content of src
+
+    auto tries a copy-on-write reflink, then a hardlink and copies the data
+    only if both fail (e.g. across file systems). A throttle limits the write
+    rate of the copy; reflinks and hardlinks write no data.'''
+    if mode in ('auto', 'reflink'):
+        try:
+            _reflink(src, dst)
+            return
+        except OSError:
+            if os.path.lexists(dst):
+                os.remove(dst)
+            if mode == 'reflink':
+                raise
+    if mode in ('auto', 'hardlink'):
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            if mode == 'hardlink':
+                raise
+    if not throttle:
+        shutil.copyfile(src, dst)
+        return
+    with open(src, 'rb') as source, open(dst, 'wb') as target:
+        for chunk in throttle.limit(iter(lambda: source.read(chunk_size), b'')):
+            target.write(chunk)
+
+def copy_dist(src, dest, fsync=False, clone='copy', throttle=None, chunk_size=CHUNK_SIZE):
+    '''copies an already extracted dist tree from src into dest'''
+    for root, _, files in os.walk(src):
+        target = os.path.join(dest, os.path.relpath(root, src))
+        os.makedirs(target, exist_ok=True)
+        for name in files:
+            path = os.path.join(target, name)
+            clone_file(os.path.join(root, name), path, clone, throttle, chunk_size)
+            os.chmod(path, 0o755)
+            if fsync:
+                fsync_path(path)
+
+def retained_versions(install):
+    '''returns the complete version directories below install, oldest first'''
+    try:
+        names = os.listdir('%s/v2' % install)
+    except FileNotFoundError:
+        return []
+    versions = [name for name in names
+                if layout.is_version(name) and is_retained(install, name)]
+    return sorted(versions, key=layout.version_key)
+
+def is_retained(install, version):
+    '''returns True if the version is fully installed below install'''
+    path = layout.version_dir(install, version)
+    return all(os.path.isfile('%s/bin/%s' % (path, exe)) for exe in EXECUTABLES)
+
+def link_version(install, bins, version, sudo=False, root=None):
+    '''points `current` and the bin symlinks at an installed version'''
+    install = layout.absolute(install, root)
+    current = layout.current_link(install)
+    replace_symlink(layout.version_dir(install, version),
+                    layout.in_root(root, current, follow=False), sudo)
+    bins = layout.in_root(root, bins)
+    if sudo:
+        profiling.run(subprocess.check_call, ['sudo', 'mkdir', '-p', bins])
+    else:
+        os.makedirs(bins, exist_ok=True)
+    for exe in EXECUTABLES:
+        replace_symlink('%s/bin/%s' % (current, exe), os.path.join(bins, exe), sudo)
+
+def _create_version_dir(path, extract):
+    try:
+        extract('%s/dist' % path)
+        os.makedirs('%s/bin' % path, exist_ok=True)
+        for exe in EXECUTABLES:
+            replace_symlink('../dist/%s' % exe, '%s/bin/%s' % (path, exe))
+    except BaseException:
+        shutil.rmtree(path, ignore_errors=True)
+        raise
+
+def _remove_stale_stages(versions):
+    for name in os.listdir(versions):
+        if name.startswith('.staging-'):
+            shutil.rmtree(os.path.join(versions, name), ignore_errors=True)
+
+def _stage_version(populate, manifest, version, install, jobs=None,
+                   chunk_size=CHUNK_SIZE):
+    versions = '%s/v2' % install
+    os.makedirs(versions, exist_ok=True)
+    _remove_stale_stages(versions)
+    stage = tempfile.mkdtemp(prefix='.staging-%s-' % version, dir=versions)
+    try:
+        os.chmod(stage, 0o755)
+        _create_version_dir(stage, lambda dist: populate(dist, True))
+        fsync_dirs(stage)
+        final_dist = '%s/dist' % layout.version_dir(install, version)
+        problems = verify.verify_tree(
+            '%s/dist' % stage, manifest, jobs, key=final_dist, reuse=False,
+            chunk_size=chunk_size)
+        if problems:
+            raise ValueError('staged version %s failed verification: %s' %
+                             (version, ', '.join(name for name, _ in problems)))
+    except BaseException:
+        shutil.rmtree(stage, ignore_errors=True)
+        raise
+    return stage
+
+def _install(populate, manifest, version, install, bins, staged, root=None,
+             jobs=None, chunk_size=CHUNK_SIZE):
+    install = layout.absolute(install, root)
+    real_install = layout.in_root(root, install)
+    with layout.locked(real_install):
+        if layout.current_version(real_install) == version:
+            return False
+        path = layout.version_dir(real_install, version)
+        stage = None
+        if staged:
+            stage = _stage_version(populate, manifest, version, real_install, jobs, chunk_size)
+        if os.path.lexists(path):
+            # left over from an earlier, possibly interrupted install
+            shutil.rmtree(path)
+        if stage:
+            os.rename(stage, path)
+            fsync_path(os.path.dirname(path))
+        else:
+            _create_version_dir(path, lambda dist: populate(dist, False))
+        link_version(install, bins, version, root=root)
+        if staged:
+            fsync_path(os.path.dirname(path))
+            fsync_path(layout.in_root(root, bins))
+    return True
+
+def install_archive(zipfile, version, install, bins, staged=False, backend=None,
+                    jobs=None, chunk_size=CHUNK_SIZE, throttle=None):
+    '''installs the AWS CLI archive as version into install and bins
+
+    Returns False (like `aws/install --update`) if the version is already the
+    current one. jobs and chunk_size apply to extraction and verification,
+    throttle to extraction.'''
+    return _install(
+        lambda dist, fsync: extract_dist(zipfile, dist, fsync, backend, chunk_size, throttle),
+        verify.manifest_from_zip(zipfile) if staged else None,
+        version, install, bins, staged, jobs=jobs, chunk_size=chunk_size)
+
+def install_tree(src, manifest, version, install, bins, staged=False,
+                 root=None, clone='copy', jobs=None, chunk_size=CHUNK_SIZE, throttle=None):
+    '''like install_archive, but clones a dist tree extracted before'''
+    return _install(
+        lambda dist, fsync: copy_dist(src, dist, fsync, clone, throttle, chunk_size),
+        manifest, version, install, bins, staged, root, jobs, chunk_size)
@@ -0,0 +1,89 @@
+'''export an AWS CLI version as a reproducible tar layer (e.g. for OCI images)
+
+The layer has the layout `aws/install` creates below a prefix. Entries are
+sorted, owned by 0:0 with fixed modes and mtimes, so the same archive always
+yields the same bytes and digest.'''
+
+import hashlib
+import os
+import posixpath
+import tarfile
+from . import install, layout
+
+MODE = 0o755
+
+
+class _HashingFile:
+    '''file wrapper computing the sha256 of everything written'''
+    def __init__(self, file):
+        self.file = file
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data):
+        '''writes data and adds it to the digest'''
+        self.sha256.update(data)
+        return self.file.write(data)
+
+    def tell(self):
+        '''returns the current position'''
+        return self.file.tell()
+
+
+def _entries(zipfile, version, prefix):
+    '''returns {path in layer: zip info, None for directories or link target}'''
+    install_dir = layout.install_dir(prefix)
+    version_dir = layout.version_dir(install_dir, version)
+    current = layout.current_link(install_dir)
+    entries = {}
+    for info in zipfile.infolist():
+        if info.filename.startswith(install.DIST_PREFIX) and not info.is_dir():
+            name = info.filename[len(install.DIST_PREFIX):]
+            path = posixpath.normpath('%s/dist/%s' % (version_dir, name))
+            if not path.startswith(version_dir + '/dist/'):
+                raise ValueError('refusing to export %s' % info.filename)
+            entries[path] = info
+    for exe in install.EXECUTABLES:
+        entries['%s/bin/%s' % (version_dir, exe)] = '../dist/%s' % exe
+        entries['%s/%s' % (layout.bin_dir(prefix), exe)] = '%s/bin/%s' % (current, exe)
+    entries[current] = version_dir
+    for path in list(entries):
+        parent = posixpath.dirname(path)
+        while parent not in ('/', '') and parent not in entries:
+            entries[parent] = None
+            parent = posixpath.dirname(parent)
+    return {path.lstrip('/'): entry for path, entry in entries.items()}
+
+def write_layer(zipfile, version, out, prefix=None, mtime=0):
+    '''writes the layer tarball to out and returns its sha256 digest'''
+    prefix = layout.absolute(prefix or layout.DEFAULT_PREFIX, '/')
+    entries = _entries(zipfile, version, prefix)
+    tmp = '%s.tmp-%d' % (out, os.getpid())
+    try:
+        with open(tmp, 'wb') as file:
+            hashing = _HashingFile(file)
+            with tarfile.open(fileobj=hashing, mode='w', format=tarfile.PAX_FORMAT) as tar:
+                for path in sorted(entries):
+                    entry = entries[path]
+                    info = tarfile.TarInfo(path)
+                    info.mtime = mtime
+                    info.mode = MODE
+                    info.uid = info.gid = 0
+                    info.uname = info.gname = ''
+                    if entry is None:
+                        info.type = tarfile.DIRTYPE
+                        tar.addfile(info)
+                    elif isinstance(entry, str):
+                        info.type = tarfile.SYMTYPE
+                        info.mode = 0o777
+                        info.linkname = entry
+                        tar.addfile(info)
+                    else:
+                        info.size = entry.file_size
+                        with zipfile.open(entry) as src:
+                            tar.addfile(info, src)
+        os.replace(tmp, out)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return 'sha256:%s' % hashing.sha256.hexdigest()
@@ -0,0 +1,103 @@
+'''paths of the AWS CLI v2 install layout as created by `aws/install`'''
+
+import contextlib
+import errno
+import os
+
+DEFAULT_PREFIX = '/usr/local'
+# like the kernel's limit on symlinks followed in one lookup
+MAX_SYMLINKS = 40
+
+
+def absolute(path, root=None):
+    '''returns path as an absolute path (inside root, if given)'''
+    if root:
+        return os.path.normpath(os.path.join('/', path))
+    return os.path.abspath(path)
+
+def in_root(root, path, follow=True):
+    '''returns the real location of path inside the root directory root
+
+    Symlinks below root are resolved as they would be inside of it: absolute
+    targets start at root and `..` never leaves it, so e.g. <root>/usr/local
+    -> /opt/local does not lead to the /opt/local of the host. With
+    follow=False a symlink in the last component is left as it is.'''
+    if not root:
+        return path
+    pending = absolute(path, root).split('/')
+    resolved = []
+    links = 0
+    while pending:
+        name = pending.pop(0)
+        if name in ('', '.'):
+            continue
+        if name == '..':
+            if resolved:
+                resolved.pop()
+            continue
+        location = os.path.join(root, *resolved, name)
+        if (follow or pending) and os.path.islink(location):
+            links += 1
+            if links > MAX_SYMLINKS:
+                raise OSError(errno.ELOOP, os.strerror(errno.ELOOP), location)
+            target = os.readlink(location)
+            if target.startswith('/'):
+                resolved = []
+            pending = target.split('/') + pending
+            continue
+        resolved.append(name)
+    return os.path.join(root, *resolved)
+
+def install_dir(prefix=None):
+    '''returns the aws-cli install directory for the given prefix'''
+    return '%s/aws-cli' % (prefix or DEFAULT_PREFIX)
+
+def bin_dir(prefix=None):
+    '''returns the directory holding the `aws` symlinks for the given prefix'''
+    return '%s/bin' % (prefix or DEFAULT_PREFIX)
+
+def version_dir(install, version):
+    '''returns the directory of one installed version'''
+    return '%s/v2/%s' % (install, version)
+
+def current_link(install):
+    '''returns the path of the `current` symlink'''
+    return '%s/v2/current' % install
+
+def lock_path(install):
+    '''returns the path of the lock file serializing changes below v2'''
+    return '%s/v2/.lock' % install
+
+@contextlib.contextmanager
+def locked(install):
+    '''holds an exclusive lock on the versions of install for the block
+
+    Concurrent runs (cron, a manual update, gc) wait for each other instead
+    of removing the staged or half written version directories of another
+    run. Without flock (Windows) the block runs unlocked.'''
+    try:
+        import fcntl  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        yield
+        return
+    os.makedirs('%s/v2' % install, exist_ok=True)
+    with open(lock_path(install), 'a') as file:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+        yield
+
+def current_version(install):
+    '''returns the version `current` points to or None'''
+    try:
+        target = os.readlink(current_link(install))
+    except OSError:
+        return None
+    return os.path.basename(target.rstrip('/'))
+
+def version_key(version):
+    '''returns a sortable key of a version string'''
+    return tuple(int(part) for part in version.split('.'))
+
+def is_version(name):
+    '''returns True if name looks like an X.Y.Z version'''
+    parts = name.split('.')
+    return len(parts) == 3 and all(part.isdigit() for part in parts)
@@ -0,0 +1,47 @@
+'''bounded memory mode (`--max-memory`)
+
+Downloading, hashing, inflating and writing all stream through buffers of a
+fixed size, so the peak RSS is the interpreter's own footprint plus a small
+constant number of buffers. In bounded mode the buffers are sized from what
+is left of the budget once the interpreter is up, nothing is held in memory
+as a whole and work that would start more processes runs sequentially.'''
+
+import re
+import sys
+
+MIN_BUFFER = 1 << 14
+MAX_BUFFER = 1 << 20
+# buffers alive at the same time: socket, download chunk, gpg pipe,
+# compressed and inflated member data, file writes, plus slack for the
+# allocator
+BUFFERS = 16
+# modules imported later, the zip directory and manifests
+RESERVE = 4 << 20
+UNITS = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+
+
+def parse_size(value):
+    '''returns the number of bytes of a size like 512K, 64M or 1G'''
+    match = re.fullmatch(r'([0-9]+)([KMG]?)(?:I?B)?', value.strip().upper())
+    if not match:
+        raise ValueError('not a size: %s' % value)
+    return int(match.group(1)) * UNITS[match.group(2)]
+
+def peak_rss():
+    '''returns the peak resident set size of this process in bytes (0 if unknown)'''
+    try:
+        import resource  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def buffer_size(max_memory):
+    '''returns the buffer size fitting max_memory or None if even the smallest does not'''
+    headroom = max_memory - peak_rss() - RESERVE
+    if headroom < BUFFERS * MIN_BUFFER:
+        return None
+    size = min(headroom // BUFFERS, MAX_BUFFER)
+    # whole pages, the kernel and zlib like them better
+    return max(MIN_BUFFER, size & ~0xfff)
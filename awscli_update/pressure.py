@@ -0,0 +1,100 @@
+'''defer installs while the host is busy
+
+Checked before an install starts, against the limits given on the command
+line:
+
+load  the 1 minute load average of /proc/loadavg per usable CPU
+io    the share of time some tasks were stalled on IO over the last 10
+cpu   seconds or waiting for a CPU, in percent (`some avg10` of
+      /proc/pressure/io and /proc/pressure/cpu, Linux 4.20+)
+
+Values that cannot be read (no PSI in the kernel, not Linux) are left out.
+While a limit is exceeded the check is repeated every POLL_INTERVAL seconds
+for up to the given wait; if the host is still busy then, the install is
+deferred: the run ends with EXIT_CODE (EX_TEMPFAIL), so the next scheduled
+run tries again. --proc-root points the checks at other files, e.g. to test
+them with fake ones.'''
+
+import os
+import time
+
+RESOURCES = ('io', 'cpu')
+POLL_INTERVAL = 10
+EXIT_CODE = 75
+
+
+class Deferred(Exception):
+    '''the host stayed too busy to install'''
+    def __init__(self, over, values):
+        super().__init__(', '.join('%s %.2f > %g' % entry for entry in over))
+        self.over = over
+        self.values = values
+
+
+def parse_limit(value):
+    '''returns (resource, percent) of a RESOURCE=PERCENT argument'''
+    resource, _, percent = value.partition('=')
+    if resource not in RESOURCES:
+        raise ValueError('unknown resource %s, expected one of %s' %
+                         (resource, ', '.join(RESOURCES)))
+    percent = float(percent)
+    if not 0 <= percent <= 100:
+        raise ValueError('pressure must be a percentage')
+    return resource, percent
+
+def _cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def read_load(proc_root='/proc'):
+    '''returns the 1 minute load average per CPU, None if unknown'''
+    try:
+        with open(os.path.join(proc_root, 'loadavg')) as file:
+            return float(file.read().split()[0]) / _cpus()
+    except (OSError, ValueError, IndexError):
+        return None
+
+def read_pressure(resource, proc_root='/proc'):
+    '''returns the `some avg10` percentage of a PSI file, None if unknown'''
+    try:
+        with open(os.path.join(proc_root, 'pressure', resource)) as file:
+            for line in file:
+                kind, *fields = line.split()
+                if kind == 'some':
+                    values = dict(field.split('=', 1) for field in fields)
+                    return float(values['avg10'])
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+def sample(limits, proc_root='/proc'):
+    '''returns the current values of the limited quantities (load, io, cpu)'''
+    values = {}
+    for name in limits:
+        value = read_load(proc_root) if name == 'load' else read_pressure(name, proc_root)
+        if value is not None:
+            values[name] = round(value, 2)
+    return values
+
+def exceeded(values, limits):
+    '''returns [(name, value, limit)] of the values above their limits'''
+    return [(name, value, limits[name]) for name, value in values.items()
+            if value > limits[name]]
+
+def wait(limits, proc_root='/proc', wait_seconds=0, interval=POLL_INTERVAL):
+    '''waits up to wait_seconds for all values to be within limits
+
+    Returns the values of the last check, raises Deferred if some are still
+    above their limits.'''
+    end = time.monotonic() + wait_seconds
+    while True:
+        values = sample(limits, proc_root)
+        over = exceeded(values, limits)
+        if not over:
+            return values
+        remaining = end - time.monotonic()
+        if remaining <= 0:
+            raise Deferred(over, values)
+        time.sleep(min(interval, remaining))
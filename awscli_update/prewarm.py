@@ -0,0 +1,157 @@
+'''`--prewarm`: read the hot files of a new version ahead of the first `aws` call
+
+A new version is a cold PyInstaller tree, so the first `aws` after an update
+waits for the disk. With --prewarm, the update starts `awscli-update prewarm
+--learn <previous version>` detached, at idle priority, which
+
+1. learns which files `aws` actually uses: those of the previous version
+   that have pages in the page cache (mincore), as relative paths, stored in
+   <cache>/hot-files.json (an older list is kept when nothing or nearly
+   everything is resident, as in a tree nothing evicted since its install)
+2. drops the new version, which the installer just wrote, from the page
+   cache, so its resident files tell the hot ones at the next update
+3. asks the kernel to read the hot files of the new version
+   (POSIX_FADV_WILLNEED)
+4. removes old versions, if --keep or --keep-days were given, only now that
+   the previous version has been looked at
+
+Without a learned list the startup files are taken from the manifest: the
+executables, shared libraries and archives PyInstaller loads on start.'''
+
+import fnmatch
+import os
+import time
+from . import background, cache
+
+# above this share of resident files the tree tells nothing about use
+MAX_RESIDENT_SHARE = 0.9
+STARTUP_PATTERNS = ('aws', '*.so', '*.so.*', 'base_library.zip', '*.pyz')
+# mmap(2) and mincore(2) constants, the same on all Linux architectures
+PROT_READ = 1
+MAP_SHARED = 1
+
+
+def _libc():
+    import ctypes  # pylint: disable=import-outside-toplevel
+    libc = ctypes.CDLL(None, use_errno=True)
+    libc.mmap.restype = ctypes.c_void_p
+    libc.mmap.argtypes = (ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int,
+                          ctypes.c_int, ctypes.c_int, ctypes.c_long)
+    libc.munmap.argtypes = (ctypes.c_void_p, ctypes.c_size_t)
+    libc.mincore.argtypes = (ctypes.c_void_p, ctypes.c_size_t, ctypes.c_char_p)
+    return ctypes, libc
+
+def is_resident(path, libc=None):
+    '''returns True if a page of the file at path is in the page cache'''
+    ctypes, libc = libc or _libc()
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        size = os.fstat(fd).st_size
+        if not size:
+            return False
+        address = libc.mmap(None, size, PROT_READ, MAP_SHARED, fd, 0)
+        if address in (None, ctypes.c_void_p(-1).value):
+            return False
+        try:
+            pages = (size + os.sysconf('SC_PAGE_SIZE') - 1) // os.sysconf('SC_PAGE_SIZE')
+            vector = ctypes.create_string_buffer(pages)
+            if libc.mincore(address, size, vector) != 0:
+                return False
+            return any(byte & 1 for byte in vector.raw)
+        finally:
+            libc.munmap(address, size)
+    finally:
+        os.close(fd)
+
+def _files(dist):
+    for root, _, names in os.walk(dist):
+        for name in names:
+            path = os.path.join(root, name)
+            if not os.path.islink(path):
+                yield path
+
+def resident_files(dist):
+    '''returns (relative paths of the files below dist with resident pages, all files)'''
+    libc = _libc()
+    files = []
+    total = 0
+    for path in _files(dist):
+        total += 1
+        try:
+            if is_resident(path, libc):
+                files.append(os.path.relpath(path, dist))
+        except OSError:
+            pass
+    return sorted(files), total
+
+def learn(dist, version):
+    '''records the resident files of the dist tree of version, returns how many'''
+    try:
+        files, total = resident_files(dist)
+    except (AttributeError, OSError):
+        # no mincore (not Linux)
+        return 0
+    if len(files) > MAX_RESIDENT_SHARE * total:
+        return 0
+    if files:
+        try:
+            cache.write_json(cache.hot_files_path(),
+                             {'version': version, 'learned': time.time(), 'files': files})
+        except OSError:
+            return 0
+    return len(files)
+
+def startup_files(manifest):
+    '''returns the files of a manifest PyInstaller reads on start'''
+    return sorted(name for name in manifest
+                  if any(fnmatch.fnmatch(os.path.basename(name), pattern)
+                         for pattern in STARTUP_PATTERNS))
+
+def hot_files(version):
+    '''returns the files to prewarm: the learned ones or those from the manifest'''
+    learned = cache.read_json(cache.hot_files_path())
+    if isinstance(learned, dict) and learned.get('files'):
+        return learned['files']
+    manifest = cache.load_manifest(version)
+    return startup_files(manifest) if manifest else []
+
+def evict(dist):
+    '''drops the files below dist from the page cache, returns how many'''
+    count = 0
+    for path in _files(dist):
+        background.drop_cache(path)
+        count += 1
+    return count
+
+def prefetch(dist, files):
+    '''asks the kernel to read files below dist, returns (files, bytes) requested'''
+    count = size = 0
+    for name in files:
+        path = os.path.join(dist, name)
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+            count += 1
+            size += os.fstat(fd).st_size
+        except (AttributeError, OSError):
+            pass
+        finally:
+            os.close(fd)
+    return count, size
+
+def spawn(prefix=None, previous=None, keep=None, keep_days=None, sudo=False):
+    '''runs `awscli-update prewarm` detached from this process at idle priority
+
+    With previous it learns from that version first, with keep or keep_days
+    it removes old versions afterwards (like gc).'''
+    arguments = ['-q', 'prewarm']
+    if previous:
+        arguments += ['--learn', previous]
+    if keep is not None:
+        arguments += ['--keep', str(keep)]
+    if keep_days is not None:
+        arguments += ['--keep-days', str(keep_days)]
+    background.spawn(arguments, prefix, sudo)
@@ -0,0 +1,98 @@
+'''`--profile`: where does the time of a run go
+
+pstats      cProfile of the main thread, written with dump_stats (read it
+            with `python -m pstats FILE`, snakeviz, ...)
+collapsed   the stacks of all threads sampled every millisecond, one
+            `frame;frame;frame count` line per distinct stack, ready for
+            flamegraph.pl or speedscope
+
+Time spent waiting for other programs (the installer, `aws --version`, sudo)
+shows up as a separate function / frame named `subprocess <program>` in both
+formats, so it can be told apart from the work done in Python.'''
+
+import collections
+import os
+import sys
+import threading
+import types
+
+FORMATS = ('pstats', 'collapsed')
+SAMPLE_INTERVAL = 0.001
+
+_ACTIVE = False
+
+
+def _span(function, args, kwargs):
+    return function(*args, **kwargs)
+
+def _label(command):
+    words = command[:2] if command[0] == 'sudo' else command[:1]
+    return 'subprocess %s' % ' '.join(os.path.basename(word) for word in words)
+
+def run(function, command, *args, **kwargs):
+    '''calls function(command, ...) (e.g. subprocess.call), as a span of its own when profiling'''
+    if not _ACTIVE:
+        return function(command, *args, **kwargs)
+    # a copy of _span named after the program, profilers then list it separately
+    code = _span.__code__.replace(co_name=_label(command))
+    span = types.FunctionType(code, _span.__globals__)
+    return span(function, (command, *args), kwargs)
+
+
+class _Sampler(threading.Thread):
+    '''counts the stacks of all other threads every interval seconds'''
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        super().__init__(name='profiler', daemon=True)
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.done = threading.Event()
+
+    def run(self):
+        names = {}
+        while not self.done.wait(self.interval):
+            for ident, frame in sys._current_frames().items():  # pylint: disable=protected-access
+                if ident == self.ident:
+                    continue
+                if ident not in names:
+                    thread = next((thread for thread in threading.enumerate()
+                                   if thread.ident == ident), None)
+                    names[ident] = thread.name if thread else 'thread-%d' % ident
+                self.stacks[(names[ident], *_frames(frame))] += 1
+
+    def write(self, path):
+        '''writes the samples in collapsed stack format'''
+        with open(path, 'w') as file:
+            for stack, count in sorted(self.stacks.items()):
+                file.write('%s %d\n' % (';'.join(stack), count))
+
+
+def _frames(frame):
+    frames = []
+    while frame:
+        code = frame.f_code
+        frames.append('%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename),
+                                      code.co_firstlineno))
+        frame = frame.f_back
+    return reversed(frames)
+
+def profile(function, path, profile_format='pstats'):
+    '''returns function(), writing a profile of the call to path'''
+    global _ACTIVE  # pylint: disable=global-statement
+    _ACTIVE = True
+    if profile_format == 'collapsed':
+        sampler = _Sampler()
+        sampler.start()
+        try:
+            return function()
+        finally:
+            sampler.done.set()
+            sampler.join()
+            sampler.write(path)
+            _ACTIVE = False
+    import cProfile  # pylint: disable=import-outside-toplevel
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function)
+    finally:
+        profiler.dump_stats(path)
+        _ACTIVE = False
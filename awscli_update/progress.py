@@ -0,0 +1,129 @@
+'''progress of installer downloads and read sizes following the throughput
+
+bar   a single line on stderr, redrawn at most every REDRAW seconds:
+      `awscli-exe-linux-x86_64-2.15.2.zip  12.0/58.3 MiB  8.1 MiB/s  ETA 0:06`
+json  one JSON object per line on stderr every EVENT_INTERVAL seconds and at
+      the end, e.g. {"event":"progress","name":...,"bytes":...,"total":...,
+      "rate":...,"eta":...} and {"event":"done",...,"seconds":...}
+
+Every read asks for about TARGET seconds worth of data at the measured rate,
+rounded down to a power of two between MIN_CHUNK and MAX_CHUNK (or the buffer
+size of --max-memory): few large reads on a fast link keep the per-chunk
+Python overhead down, small reads on a slow one keep the progress moving and
+the buffers small.'''
+
+import json
+import sys
+import time
+
+MODES = ('auto', 'bar', 'json', 'none')
+MIN_CHUNK = 1 << 16
+MAX_CHUNK = 4 << 20
+TARGET = 0.25
+REDRAW = 0.1
+EVENT_INTERVAL = 1.0
+SMOOTHING = 0.3
+MIB = 1 << 20
+
+
+def resolve_mode(mode, quiet=False, stream=sys.stderr):
+    '''returns the mode to use for auto: a bar on a terminal, nothing otherwise'''
+    if mode != 'auto':
+        return mode
+    if quiet or not stream.isatty():
+        return 'none'
+    return 'bar'
+
+def chunk_size(rate, max_chunk):
+    '''returns the read size for rate bytes per second'''
+    size = MIN_CHUNK
+    while size * 2 <= rate * TARGET and size * 2 <= max_chunk:
+        size *= 2
+    return min(size, max_chunk)
+
+def _eta(seconds):
+    seconds = int(seconds)
+    return '%d:%02d:%02d' % (seconds // 3600, seconds // 60 % 60, seconds % 60) \
+        if seconds >= 3600 else '%d:%02d' % (seconds // 60, seconds % 60)
+
+
+class Transfer:
+    '''reads a streamed response adaptively, reporting progress and throughput'''
+    def __init__(self, name, total=None, mode='none', stream=sys.stderr, check=None):
+        self.name = name
+        self.check = check
+        self.total = total
+        self.mode = mode
+        self.stream = stream
+        self.bytes = 0
+        self.rate = 0.0
+        self.start = None
+        self.seconds = 0.0
+        self.reported = 0.0
+
+    @property
+    def throughput(self):
+        '''returns the average bytes per second of the whole transfer'''
+        return self.bytes / self.seconds if self.seconds else None
+
+    def chunks(self, raw, max_chunk):
+        '''yields the content of the urllib3 response raw'''
+        self.start = last = time.perf_counter()
+        size = min(MIN_CHUNK, max_chunk)
+        while True:
+            chunk = raw.read(size, decode_content=True)
+            if not chunk:
+                # an empty read before the end can come from the content decoder
+                if raw.closed:
+                    break
+                continue
+            now = time.perf_counter()
+            if now > last:
+                rate = len(chunk) / (now - last)
+                self.rate = rate if not self.rate else \
+                    SMOOTHING * rate + (1 - SMOOTHING) * self.rate
+                size = chunk_size(self.rate, max_chunk)
+            last = now
+            if self.check:
+                self.check()
+            self.bytes += len(chunk)
+            self._report(now)
+            yield chunk
+        self.seconds = time.perf_counter() - self.start
+        self._finish()
+
+    def _report(self, now):
+        interval = REDRAW if self.mode == 'bar' else EVENT_INTERVAL
+        if self.mode not in ('bar', 'json') or now - self.reported < interval:
+            return
+        self.reported = now
+        eta = (self.total - self.bytes) / self.rate if self.total and self.rate else None
+        if self.mode == 'json':
+            self._event('progress', rate=round(self.rate),
+                        eta=round(eta, 1) if eta is not None else None)
+            return
+        line = '%s  %.1f' % (self.name, self.bytes / MIB)
+        if self.total:
+            line += '/%.1f' % (self.total / MIB)
+        line += ' MiB  %.1f MiB/s' % (self.rate / MIB)
+        if eta is not None:
+            line += '  ETA %s' % _eta(eta)
+        self.stream.write('\r%s\033[K' % line)
+        self.stream.flush()
+
+    def _finish(self):
+        if self.mode == 'json':
+            self._event('done', seconds=round(self.seconds, 3),
+                        rate=round(self.throughput) if self.throughput else None)
+        elif self.mode == 'bar':
+            self.stream.write('\r%s  %.1f MiB in %.1fs' % (self.name, self.bytes / MIB, self.seconds))
+            if self.throughput:
+                self.stream.write(' (%.1f MiB/s)' % (self.throughput / MIB))
+            self.stream.write('\033[K\n')
+            self.stream.flush()
+
+    def _event(self, event, **fields):
+        record = {'event': event, 'name': self.name, 'bytes': self.bytes, 'total': self.total}
+        record.update(fields)
+        self.stream.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self.stream.flush()
@@ -0,0 +1,149 @@
+'''caching HTTP mirror for the AWS CLI tags answer and installer artifacts
+
+Clients point `--mirror http://host:port` at it. The tags answer of the GitHub
+API is cached for a short time, artifacts are downloaded from upstream once
+and then served from the local cache with sendfile.'''
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import re
+import tempfile
+import threading
+import time
+import requests
+from . import cache, endpoints
+
+ARTIFACT_REGEX = re.compile(
+    r'/((awscli-exe-linux-(x86_64|aarch64)-[0-9.]+\.zip'
+    r'|AWSCLIV2-[0-9.]+\.(pkg|msi))(\.sig)?)')
+CHUNK_SIZE = 1 << 20
+
+
+class Upstream:
+    '''fetches from upstream at most once per resource at a time'''
+    def __init__(self, urls, tags_ttl):
+        self.urls = urls
+        self.tags_ttl = tags_ttl
+        self._tags = None
+        self._tags_time = 0
+        self._tags_lock = threading.Lock()
+        self._artifact_locks = {}
+        self._locks_lock = threading.Lock()
+
+    def tags(self):
+        '''returns the (cached) tags answer as bytes or None'''
+        with self._tags_lock:
+            if self._tags is None or time.time() - self._tags_time > self.tags_ttl:
+                try:
+                    with endpoints.fetch(self.urls.tags, self.urls.hedge_delay,
+                                         timeout=30) as result:
+                        self._tags = result.content
+                        self._tags_time = time.time()
+                except requests.RequestException:
+                    # keep serving the stale answer while upstream is down
+                    pass
+            return self._tags
+
+    def _artifact_lock(self, name):
+        with self._locks_lock:
+            return self._artifact_locks.setdefault(name, threading.Lock())
+
+    def artifact(self, name):
+        '''returns the path of the cached artifact, downloading it if needed'''
+        path = cache.artifact_path(name)
+        with self._artifact_lock(name):
+            if os.path.isfile(path):
+                return path
+            urls = self.urls.urls_for_name(name)
+            if not urls:
+                return None
+            try:
+                result = endpoints.fetch(urls, self.urls.hedge_delay, timeout=30)
+            except requests.HTTPError as err:
+                if err.response is not None and err.response.status_code == 404:
+                    return None
+                raise
+            with result:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+                try:
+                    with os.fdopen(fd, 'wb') as file:
+                        for chunk in result.iter_content(CHUNK_SIZE):
+                            file.write(chunk)
+                    os.replace(tmp, path)
+                except BaseException:
+                    os.unlink(tmp)
+                    raise
+            return path
+
+
+class MirrorHandler(BaseHTTPRequestHandler):
+    '''serves /repos/aws/aws-cli/tags and /<artifact>'''
+    upstream = None
+    tags_path = None
+    quiet = False
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        '''answers GET requests'''
+        self._answer(send_body=True)
+
+    def do_HEAD(self):  # pylint: disable=invalid-name
+        '''answers HEAD requests'''
+        self._answer(send_body=False)
+
+    def _answer(self, send_body):
+        path = self.path.split('?', 1)[0]
+        if path == self.tags_path:
+            self._send_tags(send_body)
+            return
+        match = ARTIFACT_REGEX.fullmatch(path)
+        if not match:
+            self.send_error(404)
+            return
+        try:
+            artifact = self.upstream.artifact(match.group(1))
+        except (OSError, requests.RequestException) as err:
+            self.send_error(502, 'upstream failed: %s' % err)
+            return
+        if not artifact:
+            self.send_error(404)
+            return
+        self._send_file(artifact, send_body)
+
+    def _send_tags(self, send_body):
+        tags = self.upstream.tags()
+        if tags is None:
+            self.send_error(502, 'upstream failed')
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(tags)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(tags)
+
+    def _send_file(self, path, send_body):
+        with open(path, 'rb') as file:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(os.fstat(file.fileno()).st_size))
+            self.end_headers()
+            if send_body:
+                self.wfile.flush()
+                self.connection.sendfile(file)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+def make_server(address, port, upstream, tags_path, quiet=False):
+    '''returns a threading HTTP server answering mirror requests'''
+    handler = type('Handler', (MirrorHandler,), {
+        'upstream': upstream,
+        'tags_path': tags_path,
+        'quiet': quiet,
+    })
+    server = ThreadingHTTPServer((address, port), handler)
+    server.daemon_threads = True
+    return server
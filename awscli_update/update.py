@@ -3,13 +3,20 @@
 from io import BytesIO
 import os
 import re
+import shutil
 import subprocess
+import sys
 from sys import platform
 import tempfile
-from zipfile import ZipFile
+import time
+from zipfile import BadZipFile, ZipFile
 import argparse
-import requests
-from . import __version__
+from . import cache, deadline, download, endpoints, history, inflate, install, layout, memory, \
+    profiling, progress, verify
+
+class OfflineError(Exception):
+    '''a download was needed in --offline mode'''
+
 
 class Version:
     '''AWS CLI version'''
@@ -32,13 +39,65 @@ class Version:
         return not self.__eq__(other)
 
 
+class _VersionAction(argparse.Action):
+    '''like action='version', but versioneer only runs when it is asked for'''
+    def __init__(self, option_strings, dest=argparse.SUPPRESS,
+                 default=argparse.SUPPRESS, help="show program's version number and exit"):
+        # pylint: disable=redefined-builtin
+        super().__init__(option_strings, dest, nargs=0, default=default, help=help)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        from . import __version__  # pylint: disable=import-outside-toplevel
+        print('%s %s' % (parser.prog, __version__))
+        parser.exit()
+
+
+def _version_argument(value):
+    if not re.fullmatch(r'2\.[0-9]+\.[0-9]+', value):
+        raise argparse.ArgumentTypeError('not an AWS CLI v2 version: %s' % value)
+    return value
+
+def _size_argument(value):
+    try:
+        return memory.parse_size(value)
+    except ValueError as err:
+        raise argparse.ArgumentTypeError(str(err)) from err
+
+def _timeout_argument(value):
+    try:
+        return deadline.parse_timeout(value)
+    except ValueError as err:
+        raise argparse.ArgumentTypeError(str(err)) from err
+
+def _pressure_argument(value):
+    from . import pressure  # pylint: disable=import-outside-toplevel
+    try:
+        return pressure.parse_limit(value)
+    except ValueError as err:
+        raise argparse.ArgumentTypeError(str(err)) from err
+
+def _add_retention_arguments(parser, default=None):
+    parser.add_argument(
+        '--keep',
+        metavar='N',
+        type=int,
+        default=default,
+        help='''after installing, remove old versions except the N newest
+(the current version is always kept)''')
+    parser.add_argument(
+        '--keep-days',
+        metavar='D',
+        type=float,
+        default=default,
+        help='''after installing, remove old versions installed more than D
+days ago (combined with --keep a version is kept if either allows it)''')
+
 def _parse_arguments():
     parser = argparse.ArgumentParser(
         formatter_class=argparse.RawTextHelpFormatter)
     parser.add_argument(
         '--version',
-        action='version',
-        version='%(prog)s {version}'.format(version=__version__))
+        action=_VersionAction)
     parser.add_argument(
         '-n',
         '--noop',
@@ -56,28 +115,433 @@ def _parse_arguments():
         help='''use sudo to install (e.g. when installing to /usr/local)''')
     parser.add_argument(
         '--prefix',
-        help='install aws-cli in custom path (default is /usr/local)')
-    return parser.parse_args()
+        dest='prefixes',
+        action='append',
+        metavar='PREFIX',
+        help='''install aws-cli in custom path (default is /usr/local),
+may be given multiple times''')
+    parser.add_argument(
+        '--prefixes-file',
+        metavar='FILE',
+        help='read additional prefixes from FILE (one per line)')
+    parser.add_argument(
+        '--root',
+        dest='roots',
+        action='append',
+        metavar='DIR',
+        help='''Linux only: install inside the root directory DIR (e.g. an
+unpacked container rootfs), may be given multiple times''')
+    parser.add_argument(
+        '--roots-file',
+        metavar='FILE',
+        help='read additional root directories from FILE (one per line)')
+    parser.add_argument(
+        '--clone',
+        choices=install.CLONE_MODES,
+        default='auto',
+        help='''how to put the shared extracted tree into several prefixes or
+roots: reflink, hardlink or copy (default auto tries them in this order)''')
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        help='''number of parallel workers (prefixes installed at once,
+hashing processes of verify)''')
+    parser.add_argument(
+        '--mirror',
+        dest='mirrors',
+        action='append',
+        metavar='URL',
+        help='''fetch the tags answer and installer artifacts from a mirror
+(e.g. `awscli-update serve`) instead of GitHub and awscli.amazonaws.com,
+may be given multiple times to hedge requests''')
+    parser.add_argument(
+        '--tags-url',
+        dest='tags_urls',
+        action='append',
+        metavar='URL',
+        help='URL of the GitHub tags answer, may be given multiple times')
+    parser.add_argument(
+        '--artifact-url',
+        dest='artifact_urls',
+        action='append',
+        metavar='TEMPLATE',
+        help='''URL of the installer for this platform with a {version}
+placeholder, may be given multiple times''')
+    parser.add_argument(
+        '--version-source',
+        dest='version_sources',
+        action='append',
+        choices=endpoints.VERSION_SOURCES,
+        help='''where to look up the latest version, may be given multiple
+times to race the sources (default is all, or tags with --mirror)''')
+    parser.add_argument(
+        '--hedge-delay',
+        metavar='SECONDS',
+        type=float,
+        help='''with several URLs, try the next one if there was no answer
+after this long (default is %s)''' % endpoints.HEDGE_DELAY)
+    parser.add_argument(
+        '--config',
+        metavar='FILE',
+        help='''config file with an [endpoints] section
+(default is $AWSCLI_UPDATE_CONFIG or ~/.config/awscli-update/config.ini)''')
+    parser.add_argument(
+        '--version-pin',
+        metavar='X.Y.Z',
+        type=_version_argument,
+        help='install this AWS CLI version instead of the latest one')
+    parser.add_argument(
+        '--cache-ttl',
+        metavar='SECONDS',
+        type=float,
+        default=0,
+        help='''reuse the latest version looked up by an earlier run if that
+was less than SECONDS ago (default is 0, always look it up)''')
+    parser.add_argument(
+        '--offline',
+        action='store_true',
+        help='''never use the network: take the latest version recorded in
+the cache (e.g. from `bundle import`) and only install cached artifacts''')
+    parser.add_argument(
+        '--installer',
+        choices=('native', 'script'),
+        default='native',
+        help='''Linux only: extract the archive directly into place (native)
+or run the bundled aws/install script (script, implied by --sudo).
+native falls back to script if it fails (default is native)''')
+    parser.add_argument(
+        '--inflate',
+        choices=inflate.CHOICES,
+        default='auto',
+        help='''decompression backend for the archive; auto uses isal or
+zlib-ng if installed, else zlib (default is auto)''')
+    parser.add_argument(
+        '--sha256',
+        action='append',
+        metavar='HEX',
+        help='''expected SHA-256 of the installer, checked while downloading
+and before anything is extracted, may be given multiple times''')
+    parser.add_argument(
+        '--verify-signature',
+        action='store_true',
+        help='''check the installer against its detached PGP signature
+(<artifact>.sig) with gpg while downloading; the AWS CLI
+release key must be in the keyring ($GNUPGHOME)''')
+    parser.add_argument(
+        '--ignore-circuits',
+        action='store_true',
+        help='''also try endpoints that failed recently instead of
+skipping them until their retry time''')
+    parser.add_argument(
+        '--deadline',
+        metavar='SECONDS',
+        type=float,
+        help='''give up the whole run after SECONDS, exiting with %d'''
+        % deadline.EXIT_CODE)
+    parser.add_argument(
+        '--timeout',
+        metavar='PHASE=SECONDS',
+        dest='timeouts',
+        type=_timeout_argument,
+        action='append',
+        default=[],
+        help='''give up when a phase (%s) takes longer than
+SECONDS, exiting with %d (repeatable)''' % (', '.join(deadline.PHASES), deadline.EXIT_CODE))
+    parser.add_argument(
+        '--background',
+        action='store_true',
+        help='''run at the lowest CPU and IO priority (installer included)
+and drop the archive from the page cache after use''')
+    parser.add_argument(
+        '--max-write-rate',
+        metavar='RATE',
+        type=_size_argument,
+        help='''write the download and the extracted files at no more than
+RATE bytes per second (e.g. 20M)''')
+    parser.add_argument(
+        '--prewarm',
+        action='store_true',
+        help='''Linux only: after an install, read the files `aws` uses
+into the page cache in the background''')
+    parser.add_argument(
+        '--max-load',
+        metavar='LOAD',
+        type=float,
+        help='''defer the install while the 1 minute load average per CPU
+is above LOAD''')
+    parser.add_argument(
+        '--max-pressure',
+        metavar='RESOURCE=PERCENT',
+        dest='max_pressures',
+        type=_pressure_argument,
+        action='append',
+        default=[],
+        help='''defer the install while the PSI `some avg10` of RESOURCE
+(io, cpu) is above PERCENT (repeatable)''')
+    parser.add_argument(
+        '--defer-wait',
+        metavar='SECONDS',
+        type=float,
+        default=0,
+        help='''wait up to SECONDS for the load to drop before deferring
+the install (exit code 75, default is 0)''')
+    parser.add_argument(
+        '--proc-root',
+        metavar='PATH',
+        default='/proc',
+        help='read loadavg and pressure/* below PATH (default is /proc)')
+    parser.add_argument(
+        '--max-memory',
+        metavar='SIZE',
+        type=_size_argument,
+        help='''keep the peak memory use below SIZE (e.g. 64M): stream
+everything through small fixed-size buffers and work
+sequentially (-j defaults to 1)''')
+    parser.add_argument(
+        '--progress',
+        choices=progress.MODES,
+        default='auto',
+        help='''download progress on stderr: a progress bar, JSON
+events or none (default is a bar on a terminal unless -q)''')
+    parser.add_argument(
+        '--staged',
+        action='store_true',
+        help='''native installer: build, fsync and verify the new version
+aside and switch to it with a single atomic rename''')
+    parser.add_argument(
+        '--profile',
+        metavar='PATH',
+        help='''write a profile of the run to PATH (subprocesses show up as
+`subprocess <program>`)''')
+    parser.add_argument(
+        '--profile-format',
+        choices=profiling.FORMATS,
+        default='pstats',
+        help='''pstats (cProfile, default) or collapsed (sampled stacks of
+all threads for flame graphs)''')
+    parser.add_argument(
+        '--no-history',
+        dest='history',
+        action='store_false',
+        help='do not record this run in the history shown by `stats`')
+    _add_retention_arguments(parser)
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    verify_parser = commands.add_parser(
+        'verify',
+        help='check the installed files against the archive manifest')
+    verify_parser.add_argument(
+        '--prefix',
+        dest='prefixes',
+        action='append',
+        metavar='PREFIX',
+        default=argparse.SUPPRESS,
+        help='aws-cli install path to check (default is /usr/local)')
+    verify_parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=argparse.SUPPRESS,
+        help='number of hashing processes (default is one per CPU)')
+    verify_parser.add_argument(
+        'release',
+        nargs='?',
+        help='installed version to check (default is the current one)')
+    rollback_parser = commands.add_parser(
+        'rollback',
+        help='switch back to a previously installed version')
+    rollback_parser.add_argument(
+        '--prefix',
+        dest='prefixes',
+        action='append',
+        metavar='PREFIX',
+        default=argparse.SUPPRESS,
+        help='aws-cli install path (default is /usr/local)')
+    rollback_parser.add_argument(
+        'release',
+        nargs='?',
+        type=_version_argument,
+        help='version to switch to (default is the newest older one)')
+    gc_parser = commands.add_parser(
+        'gc',
+        help='remove old versions according to --keep and --keep-days')
+    gc_parser.add_argument(
+        '--prefix',
+        dest='prefixes',
+        action='append',
+        metavar='PREFIX',
+        default=argparse.SUPPRESS,
+        help='aws-cli install path (default is /usr/local)')
+    _add_retention_arguments(gc_parser, default=argparse.SUPPRESS)
+    prewarm_parser = commands.add_parser(
+        'prewarm',
+        help='read the hot files of the current version into the page cache')
+    prewarm_parser.add_argument(
+        '--prefix',
+        dest='prefixes',
+        action='append',
+        metavar='PREFIX',
+        default=argparse.SUPPRESS,
+        help='aws-cli install path (default is /usr/local)')
+    prewarm_parser.add_argument(
+        '--learn',
+        metavar='X.Y.Z',
+        type=_version_argument,
+        help='''first learn the hot files from this older installed version
+and drop the current one from the page cache (as after an update)''')
+    _add_retention_arguments(prewarm_parser, default=argparse.SUPPRESS)
+    serve_parser = commands.add_parser(
+        'serve',
+        help='run a caching mirror for the tags answer and installer artifacts')
+    serve_parser.add_argument(
+        '--bind',
+        default='0.0.0.0',
+        help='address to listen on (default is 0.0.0.0)')
+    serve_parser.add_argument(
+        '--port',
+        type=int,
+        default=8080,
+        help='port to listen on (default is 8080)')
+    serve_parser.add_argument(
+        '--tags-ttl',
+        metavar='SECONDS',
+        type=float,
+        default=300,
+        help='how long to cache the tags answer (default is 300)')
+    bundle_parser = commands.add_parser(
+        'bundle',
+        help='export or import cached artifacts for offline hosts')
+    bundle_commands = bundle_parser.add_subparsers(
+        dest='bundle_command', metavar='{export,import}', required=True)
+    export_parser = bundle_commands.add_parser(
+        'export',
+        help='write cached artifacts, manifests and version state to a tarball')
+    export_parser.add_argument(
+        '-o',
+        '--out',
+        default='awscli-update-bundle.tar',
+        help='bundle file (.tar, .tar.gz, .tar.xz; default is awscli-update-bundle.tar)')
+    export_parser.add_argument(
+        '--platform',
+        dest='platforms',
+        action='append',
+        choices=sorted(endpoints.ARTIFACTS),
+        help='include the installer for this platform (default is this host)')
+    export_parser.add_argument(
+        'releases',
+        nargs='*',
+        metavar='release',
+        type=_version_argument,
+        help='versions to include (default is the latest one)')
+    import_parser = bundle_commands.add_parser(
+        'import',
+        help='add the contents of a bundle to the cache')
+    import_parser.add_argument(
+        'bundle_file',
+        metavar='file',
+        help='bundle written by `bundle export`')
+    stats_parser = commands.add_parser(
+        'stats',
+        help='summarize the recorded runs (durations per phase, failures, cache hits)')
+    stats_parser.add_argument(
+        '--days',
+        type=float,
+        default=30,
+        help='only look at the runs of the last DAYS days (default is 30)')
+    layer_parser = commands.add_parser(
+        'export-layer',
+        help='write a version as a reproducible tar layer (e.g. for OCI images)')
+    layer_parser.add_argument(
+        '--version',
+        dest='release',
+        metavar='X.Y.Z',
+        type=_version_argument,
+        help='version to export (default is the latest one)')
+    layer_parser.add_argument(
+        '-o',
+        '--out',
+        default='awscli-layer.tar',
+        help='layer file to write (default is awscli-layer.tar)')
+    layer_parser.add_argument(
+        '--prefix',
+        dest='prefixes',
+        action='append',
+        metavar='PREFIX',
+        default=argparse.SUPPRESS,
+        help='install path inside the layer (default is /usr/local)')
+    layer_parser.add_argument(
+        '--platform',
+        choices=sorted(key for key in endpoints.ARTIFACTS if key.startswith('linux')),
+        help='Linux installer to use (default is this host or linux-x86_64)')
+    args = parser.parse_args()
+    args.prefixes = args.prefixes or []
+    if args.prefixes_file:
+        args.prefixes.extend(_read_prefixes(args.prefixes_file))
+    args.prefix = args.prefixes[0] if args.prefixes else None
+    args.roots = args.roots or []
+    if args.roots_file:
+        args.roots.extend(_read_prefixes(args.roots_file))
+    args.root = None
+    args.endpoints = endpoints.load(args)
+    try:
+        args.inflate_backend = inflate.load(args.inflate)
+    except ImportError:
+        parser.error("inflate backend %s is not installed" % args.inflate)
+    args.chunk_size = download.CHUNK_SIZE
+    if args.max_memory:
+        args.chunk_size = memory.buffer_size(args.max_memory)
+        if not args.chunk_size:
+            parser.error("--max-memory must leave room above the %d MiB the interpreter uses" %
+                         (memory.peak_rss() >> 20))
+        args.jobs = args.jobs or 1
+    args.progress = progress.resolve_mode(args.progress, args.quiet)
+    args.throttle = None
+    if args.max_write_rate:
+        from . import background  # pylint: disable=import-outside-toplevel
+        args.throttle = background.Throttle(args.max_write_rate)
+    args.pressure_limits = dict(args.max_pressures)
+    if args.max_load is not None:
+        args.pressure_limits['load'] = args.max_load
+    return args
+
+def _read_prefixes(path):
+    with open(path) as file:
+        lines = (line.split('#', 1)[0].strip() for line in file)
+        return [line for line in lines if line]
 
-def get_latest_version():
+def get_latest_version(config=None, circuits=None):
     '''returns the latest available AWS CLI version'''
-    tags_url = 'https://api.github.com/repos/aws/aws-cli/tags'
-    version_regex = re.compile(r'([0-9]+)\.([0-9]+)\.([0-9]+)')
+    # pylint: disable=import-outside-toplevel
+    from http.client import HTTPException
+    from xml.etree import ElementTree
+    from . import discovery
     try:
-        result = requests.get(tags_url)
-        tags = result.json()
-        version = tags[0]['name']
-        match = version_regex.match(version)
-    except (ConnectionError, IndexError) as _:
+        return Version(discovery.latest_version(config or endpoints.Endpoints(), circuits))
+    except (OSError, HTTPException, ValueError, IndexError, KeyError,
+            ElementTree.ParseError) as _:
         return None
-    return Version(version) if match else None
 
-def get_current_version():
+def _native_version(aws):
+    '''returns the version of a v2 install from the path of its aws (or None)
+
+    The installer keeps every version in <install-dir>/v2/<version>, so the
+    version can be read from the resolved symlink instead of starting aws.'''
+    match = re.search(r'/v2/(2\.[0-9]+\.[0-9]+)/dist/aws$', os.path.realpath(aws))
+    return match.group(1) if match else None
+
+def get_current_version(timeout=None):
     '''returns the currently installed AWS CLI version'''
     version_regex = re.compile(r'aws-cli\/([0-9.]+)')
     version_v2_regex = re.compile(r'2\.([0-9]+)\.([0-9]+)')
+    aws = shutil.which('aws')
+    if not aws:
+        return None
+    version = _native_version(aws)
+    if version:
+        return Version(version)
     try:
-        version_string = subprocess.check_output(['aws', '--version']).decode('utf-8')
+        version_string = profiling.run(subprocess.check_output, ['aws', '--version'],
+                                       timeout=timeout).decode('utf-8')
         match = version_regex.search(version_string)
         version = match.groups()[0] if match else None
         v_2 = version is not None and version_v2_regex.match(version) is not None
@@ -85,150 +549,809 @@ def get_current_version():
         return None
     return Version(version, v_2)
 
-def _linux_install(version, args):
+def _download(version, args, key=None):
+    '''returns the streamed response for the installer of version'''
+    if args.offline:
+        raise OfflineError("%s is not cached" % args.endpoints.artifact_name(version, key))
+    return endpoints.fetch(args.endpoints.artifact_urls(version, key),
+                           args.endpoints.hedge_delay, args.circuits,
+                           timeout=args.budget.timeout())
+
+def _save_manifest(version, zipfile):
+    try:
+        cache.save_manifest(version, verify.manifest_from_zip(zipfile))
+    except OSError as err:
+        print("failed to store archive manifest: %s" % err)
+
+def _linux_extract(zipfile, tmp, args):
+    with args.budget.phase('extract'):
+        install.extract_members(zipfile, tmp, backend=args.inflate_backend,
+                                chunk_size=args.chunk_size, throttle=args.throttle)
+
+def _linux_run_script(tmp, args):
+    install_command = ["%s/aws/install" % tmp, '--update']
+    if args.prefix:
+        install_command = [
+            *install_command,
+            '--install-dir', "%s/aws-cli" % args.prefix,
+            '--bin-dir', "%s/bin" % args.prefix
+        ]
+    if args.sudo:
+        install_command = ['sudo', *install_command]
+    return _call_installer(install_command, args)
+
+def _call_installer(command, args):
+    '''runs an installer program within the install timeout, returns its exit code'''
+    with args.budget.phase('install'):
+        code = profiling.run(deadline.call, command, timeout=args.budget.timeout(),
+                             stdout=subprocess.DEVNULL if args.quiet else None)
+    if code != 0:
+        program = command[1] if command[0] == 'sudo' else command[0]
+        print("%s exited with code %d" % (os.path.basename(program), code))
+    return code
+
+def _linux_script_install(zipfile, args):
     with tempfile.TemporaryDirectory() as tmp:
-        url = "https://awscli.amazonaws.com/awscli-exe-linux-x86_64-%s.zip" % version.version
-        with requests.get(url, allow_redirects=True) as result:
-            with ZipFile(BytesIO(result.content)) as zipfile:
-                zipfile.extractall(path=tmp)
-            install_script = "%s/aws/install" % tmp
-            install_command = [install_script, '--update']
-            if args.prefix:
-                install_command = [
-                    *install_command,
-                    '--install-dir', "%s/aws-cli" % args.prefix,
-                    '--bin-dir', "%s/bin" % args.prefix
-                ]
-            if args.sudo:
-                install_command = ['sudo', *install_command]
-            os.chmod(install_script, 0o755)
-            for root, _, files in os.walk("%s/aws/dist" % tmp):
-                for file in files:
-                    os.chmod(os.path.join(root, file), 0o755)
-            if args.quiet:
-                subprocess.call(install_command, stdout=subprocess.DEVNULL)
-            else:
-                subprocess.call(install_command)
+        _linux_extract(zipfile, tmp, args)
+        return _linux_run_script(tmp, args)
+
+def _linux_native_install(zipfile, version, args):
+    install_dir = layout.install_dir(args.prefix)
+    bin_dir = layout.bin_dir(args.prefix)
+    # the native installer extracts right into place
+    with args.budget.phase('extract'):
+        installed = install.install_archive(
+            zipfile, version.version, install_dir, bin_dir, staged=args.staged,
+            backend=args.inflate_backend, jobs=args.jobs, chunk_size=args.chunk_size,
+            throttle=args.throttle)
+    if not installed:
+        if not args.quiet:
+            print("Found same AWS CLI version: %s. Skipping install." %
+                  layout.version_dir(install_dir, version.version))
+    elif not args.quiet:
+        print("You can now run: %s/aws --version" % bin_dir)
+
+def _signature(version, args, key=None):
+    '''returns the detached PGP signature of the installer of version'''
+    name = "%s.sig" % args.endpoints.artifact_name(version, key)
+    path = cache.artifact_path(name)
+    if os.path.isfile(path):
+        with open(path, 'rb') as file:
+            return file.read()
+    if args.offline:
+        raise OfflineError("%s is not cached" % name)
+    urls = ["%s.sig" % url for url in args.endpoints.artifact_urls(version, key)]
+    try:
+        with endpoints.fetch(urls, args.endpoints.hedge_delay, args.circuits,
+                             timeout=args.budget.timeout()) as result:
+            signature = result.content
+    except Exception as err:  # pylint: disable=broad-except
+        if not _request_failed(err):
+            raise
+        raise download.VerificationError("no signature for %s (%s)" %
+                                         (args.endpoints.artifact_name(version, key), err)) from err
+    try:
+        cache.save_artifact(path, signature)
+    except OSError:
+        pass
+    return signature
+
+def _record_digest(name, digest, signed):
+    try:
+        cache.save_digest(name, digest, signed)
+    except OSError:
+        pass
+
+def _check_cached_artifact(version, args, key=None):
+    '''verifies a cached installer, reading it only if its digest was never recorded'''
+    if not args.sha256 and not args.verify_signature:
+        return
+    name = args.endpoints.artifact_name(version, key)
+    record = cache.load_digest(name)
+    if record and (record['signed'] or not args.verify_signature):
+        download.check_digest(name, record['sha256'], args.sha256)
+        return
+    signature = _signature(version, args, key) if args.verify_signature else None
+    digest = download.check_file(cache.artifact_path(name), args.sha256, signature,
+                                 args.chunk_size)
+    _record_digest(name, digest, signature is not None)
+
+def _cacheable(path):
+    directory = os.path.dirname(path)
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError:
+        return False
+    return os.access(directory, os.W_OK)
+
+def _cached_artifact(version, args, key=None):
+    '''returns the cached installer of version, downloading it if needed
+
+    Downloads are verified on the fly (see download) and only end up in the
+    cache if they match --sha256 and, with --verify-signature, the signature.'''
+    name = args.endpoints.artifact_name(version, key)
+    path = cache.artifact_path(name)
+    if os.path.isfile(path):
+        args.run.cache_hit = True
+        _check_cached_artifact(version, args, key)
+        return path
+    args.run.cache_hit = False
+    with args.run.phase('download'), args.budget.phase('download'):
+        return _download_artifact(version, args, key)
+
+def _download_artifact(version, args, key):
+    name = args.endpoints.artifact_name(version, key)
+    path = cache.artifact_path(name)
+    signature = _signature(version, args, key) if args.verify_signature else None
+    with _download(version, args, key) as result:
+        length = result.headers.get('Content-Length')
+        transfer = progress.Transfer(name, int(length) if length else None, args.progress,
+                                     check=args.budget.check)
+        max_chunk = args.chunk_size if args.max_memory else progress.MAX_CHUNK
+        chunks = args.run.count(transfer.chunks(result.raw, max_chunk))
+        if args.throttle:
+            chunks = args.throttle.limit(chunks)
+        if not _cacheable(path):
+            # with a memory limit the uncached installer goes to a temporary file
+            buffer = tempfile.TemporaryFile() if args.max_memory else BytesIO()
+            download.save(chunks, buffer, name, args.sha256, signature)
+            args.run.throughput = transfer.throughput
+            buffer.seek(0)
+            return buffer
+        with cache.artifact_writer(path) as file:
+            digest = download.save(chunks, file, name, args.sha256, signature)
+    args.run.throughput = transfer.throughput
+    _record_digest(name, digest, signature is not None)
+    return path
+
+def _local_artifact(version, args, path):
+    '''returns a file path of the installer, writing it to path if it is not cached'''
+    artifact = _cached_artifact(version, args)
+    if isinstance(artifact, str):
+        return artifact
+    with artifact, open(path, 'wb') as file:
+        shutil.copyfileobj(artifact, file, args.chunk_size)
+    return path
+
+def _linux_activate(version, args):
+    '''switches to an already installed version, returns False if there is none'''
+    install_dir = layout.install_dir(args.prefix)
+    if not install.is_retained(install_dir, version.version):
+        return False
+    install.link_version(install_dir, layout.bin_dir(args.prefix),
+                         version.version, sudo=args.sudo)
+    if not args.quiet:
+        print("switched to retained AWS CLI version %s" % version.version)
+    return True
+
+def _linux_install_archive(version, args):
+    '''installs from the (cached) archive, returns True on success'''
+    archive = _cached_artifact(version.version, args)
+    try:
+        with ZipFile(archive) as zipfile:
+            _save_manifest(version.version, zipfile)
+            if args.installer == 'native' and not args.sudo:
+                try:
+                    _linux_native_install(zipfile, version, args)
+                    return True
+                except (OSError, ValueError) as err:
+                    if args.staged:
+                        # aws/install copies in place, what --staged is there to avoid
+                        print("staged install failed: %s. aborting." % err)
+                        return False
+                    print("native install failed (%s), using aws/install" % err)
+            return _linux_script_install(zipfile, args) == 0
+    except BadZipFile:
+        if isinstance(archive, str):
+            os.remove(archive)
+        raise
+    finally:
+        if args.background and isinstance(archive, str):
+            from . import background  # pylint: disable=import-outside-toplevel
+            background.drop_cache(archive)
+
+def _schedule_gc(args):
+    if args.keep is not None or args.keep_days is not None:
+        from . import gc  # pylint: disable=import-outside-toplevel
+        gc.spawn(args.prefix, args.keep, args.keep_days, args.sudo, args.root)
+
+def _schedule_prewarm(args, previous):
+    '''starts prewarming the new version, returns False if --prewarm does not apply
+
+    The prewarm run learns from the previous version and runs gc after that,
+    so gc cannot remove the previous version before it was looked at.'''
+    if not args.prewarm or args.root:
+        return False
+    from . import prewarm  # pylint: disable=import-outside-toplevel
+    if previous == layout.current_version(layout.install_dir(args.prefix)):
+        previous = None
+    prewarm.spawn(args.prefix, previous, args.keep, args.keep_days, args.sudo)
+    return True
+
+def _linux_install(version, args):
+    previous = layout.current_version(layout.install_dir(args.prefix))
+    if _linux_activate(version, args) or _linux_install_archive(version, args):
+        if not _schedule_prewarm(args, previous):
+            _schedule_gc(args)
+        return True
+    return False
+
+def _prefix_args(args, prefix, root=None):
+    return argparse.Namespace(**dict(vars(args), prefix=prefix, root=root))
+
+def _target_label(target):
+    prefix = target.prefix or layout.DEFAULT_PREFIX
+    return "%s:%s" % (target.root, prefix) if target.root else prefix
+
+def _linux_batch_install_one(version, args, tmp, manifest):
+    '''installs into one prefix/root from the shared extracted tree, returns the result'''
+    install_dir = layout.install_dir(args.prefix)
+    bin_dir = layout.bin_dir(args.prefix)
+    previous = layout.current_version(layout.in_root(args.root, install_dir))
+    try:
+        if install.is_retained(layout.in_root(args.root, install_dir), version.version):
+            install.link_version(install_dir, bin_dir, version.version,
+                                 sudo=args.sudo, root=args.root)
+            result = "switched to retained version %s" % version.version
+        elif args.installer == 'native' and not args.sudo:
+            install.install_tree("%s/aws/dist" % tmp, manifest, version.version,
+                                 install_dir, bin_dir, staged=args.staged,
+                                 root=args.root, clone=args.clone,
+                                 jobs=args.jobs, chunk_size=args.chunk_size,
+                                 throttle=args.throttle)
+            result = "installed version %s" % version.version
+        elif _linux_run_script(tmp, args) == 0:
+            result = "installed version %s" % version.version
+        else:
+            return False, "aws/install failed"
+    except (OSError, ValueError, subprocess.CalledProcessError) as err:
+        return False, "failed (%s)" % err
+    if not _schedule_prewarm(args, previous):
+        _schedule_gc(args)
+    return True, result
+
+def _work_dir(args):
+    '''returns where to extract the shared tree, next to the roots if possible'''
+    if args.roots:
+        parent = os.path.dirname(os.path.abspath(args.roots[0]))
+        if os.access(parent, os.W_OK):
+            return parent
+    return None
+
+def _linux_batch_install(version, args):
+    '''installs version into all prefixes and roots from a single download and extraction'''
+    targets = []
+    for root in args.roots or [None]:
+        for prefix in args.prefixes or [None]:
+            target = _prefix_args(args, prefix, root)
+            real_install = layout.in_root(root, layout.install_dir(prefix))
+            current = layout.current_version(real_install)
+            if current != version.version:
+                targets.append(target)
+            elif not args.quiet:
+                print("%s: already on version %s" % (_target_label(target), current))
+    if not targets:
+        return 0
+    _wait_for_capacity(args)
+    with tempfile.TemporaryDirectory(prefix='.awscli-update-', dir=_work_dir(args)) as tmp:
+        manifest = None
+        if not all(install.is_retained(layout.in_root(target.root, layout.install_dir(target.prefix)),
+                                       version.version)
+                   for target in targets):
+            archive = _cached_artifact(version.version, args)
+            with ZipFile(archive) as zipfile:
+                _save_manifest(version.version, zipfile)
+                manifest = verify.manifest_from_zip(zipfile)
+                _linux_extract(zipfile, tmp, args)
+            if args.background and isinstance(archive, str):
+                from . import background  # pylint: disable=import-outside-toplevel
+                background.drop_cache(archive)
+        workers = args.jobs or min(len(targets), 8)
+        # imported here, concurrent.futures slows down every start of the script
+        from concurrent.futures import ThreadPoolExecutor  # pylint: disable=import-outside-toplevel
+        with ThreadPoolExecutor(max_workers=workers) as executor, \
+                args.budget.phase('install'):
+            try:
+                results = list(executor.map(
+                    lambda target: _linux_batch_install_one(version, target, tmp, manifest),
+                    targets))
+            except BaseException:
+                # targets not started yet are skipped, running ones finish or clean up
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+    failed = 0
+    for target, (success, result) in zip(targets, results):
+        if not success:
+            failed += 1
+        if not success or not args.quiet:
+            print("%s: %s" % (_target_label(target), result))
+    return 1 if failed else 0
 
 def _darwin_install(version, args):
     with tempfile.TemporaryDirectory() as tmp:
-        pkg = "%s/awscli.pkg" % tmp
-        url = "https://awscli.amazonaws.com/AWSCLIV2-%s.pkg" % version.version
-        with requests.get(url, allow_redirects=True) as result:
-            install_command = ['installer', '-pkg', pkg]
-            with open(pkg, 'wb') as file:
-                file.write(result.content)
-            if args.prefix:
-                xml = "%s/choiceChanges.xml" % tmp
-                with open(xml, 'w') as file:
-                    file.write('''
-                    <?xml version="1.0" encoding="UTF-8"?>
-                    <!DOCTYPE plist PUBLIC "-//Apple//DTD PLIST 1.0//EN" "http://www.apple.com/DTDs/PropertyList-1.0.dtd">
-                    <plist version="1.0">
-                      <array>
-                        <dict>
-                          <key>choiceAttribute</key>
-                          <string>customLocation</string>
-                          <key>attributeSetting</key>
-                          <string>%s</string>
-                          <key>choiceIdentifier</key>
-                          <string>default</string>
-                        </dict>
-                      </array>
-                    </plist>
-                    ''' % args.prefix)
-                install_command = [
-                    *install_command,
-                    '-target', 'CurrentUserHomeDirectory',
-                    '-applyChoiceChangesXML', xml]
-            else:
-                install_command = [*install_command, '-target', '/']
-            if args.sudo:
-                install_command = ['sudo', *install_command]
-            if args.quiet:
-                subprocess.call(install_command, stdout=subprocess.DEVNULL)
-            else:
-                subprocess.call(install_command)
-            if args.prefix:
-                os.makedirs(args.prefix, exist_ok=True)
-                aws_bin_src = "%s/aws-cli/aws" % args.prefix
-                aws_bin_dst = "%s/bin/aws" % args.prefix
-                aws_cmp_src = "%s/aws-cli/aws_completer" % args.prefix
-                aws_cmp_dst = "%s/bin/aws_completer" % args.prefix
-                if os.path.exists(aws_bin_dst):
-                    os.remove(aws_bin_dst)
-                if os.path.exists(aws_cmp_dst):
-                    os.remove(aws_cmp_dst)
-                os.symlink(aws_bin_src, aws_bin_dst)
-                os.symlink(aws_cmp_src, aws_cmp_dst)
+        pkg = _local_artifact(version.version, args, "%s/awscli.pkg" % tmp)
+        install_command = ['installer', '-pkg', pkg]
+        if args.prefix:
+            xml = "%s/choiceChanges.xml" % tmp
+            with open(xml, 'w') as file:
+                file.write('''
+                <?xml version="1.0" encoding="UTF-8"?>
+                <!DOCTYPE plist PUBLIC "-//Apple//DTD PLIST 1.0//EN" "http://www.apple.com/DTDs/PropertyList-1.0.dtd">
+                <plist version="1.0">
+                  <array>
+                    <dict>
+                      <key>choiceAttribute</key>
+                      <string>customLocation</string>
+                      <key>attributeSetting</key>
+                      <string>%s</string>
+                      <key>choiceIdentifier</key>
+                      <string>default</string>
+                    </dict>
+                  </array>
+                </plist>
+                ''' % args.prefix)
+            install_command = [
+                *install_command,
+                '-target', 'CurrentUserHomeDirectory',
+                '-applyChoiceChangesXML', xml]
+        else:
+            install_command = [*install_command, '-target', '/']
+        if args.sudo:
+            install_command = ['sudo', *install_command]
+        if _call_installer(install_command, args) != 0:
+            return False
+        if args.prefix:
+            os.makedirs(args.prefix, exist_ok=True)
+            aws_bin_src = "%s/aws-cli/aws" % args.prefix
+            aws_bin_dst = "%s/bin/aws" % args.prefix
+            aws_cmp_src = "%s/aws-cli/aws_completer" % args.prefix
+            aws_cmp_dst = "%s/bin/aws_completer" % args.prefix
+            if os.path.exists(aws_bin_dst):
+                os.remove(aws_bin_dst)
+            if os.path.exists(aws_cmp_dst):
+                os.remove(aws_cmp_dst)
+            os.symlink(aws_bin_src, aws_bin_dst)
+            os.symlink(aws_cmp_src, aws_cmp_dst)
+    return True
 
 def _windows_install(version, args):
     if args.sudo or args.prefix:
         print("--sudo and --prefix are not supported on Windows")
-        return
+        return False
     with tempfile.TemporaryDirectory() as tmp:
-        msi = "%s/awscliv2.msi" % tmp
-        url = "https://awscli.amazonaws.com/AWSCLIV2-%s.msi" % version.version
-        with requests.get(url, allow_redirects=True) as result:
-            with open(msi, 'wb') as file:
-                file.write(result.content)
-            install_command = ['msiexec.exe', '/i', msi, '/passive']
-            if args.quiet:
-                subprocess.call(install_command, stdout=subprocess.DEVNULL)
-            else:
-                subprocess.call(install_command)
+        msi = _local_artifact(version.version, args, "%s/awscliv2.msi" % tmp)
+        install_command = ['msiexec.exe', '/i', msi, '/passive']
+        return _call_installer(install_command, args) == 0
 
 def install_new_version(version, args):
-    '''Installs new AWS CLI with provided version'''
+    '''Installs new AWS CLI with provided version, returns True on success'''
     if not version.v_2:
         print("This script can only install AWS CLI v2")
-        return
+        return False
     if platform == 'linux':
-        _linux_install(version, args)
-    elif platform == 'darwin':
-        _darwin_install(version, args)
-    elif platform == 'win32':
-        _windows_install(version, args)
-    else:
-        pass
+        return _linux_install(version, args)
+    if platform == 'darwin':
+        return _darwin_install(version, args)
+    if platform == 'win32':
+        return _windows_install(version, args)
+    print("platform %s is not supported" % platform)
+    return False
+
+def _target_version(args):
+    with args.run.phase('check'), args.budget.phase('discovery'):
+        version = _lookup_version(args)
+    if version:
+        args.run.set_versions(target=version.version)
+    return version
 
-def compare_only():
-    '''Check for new version but don't update'''
-    current_version = get_current_version()
-    latest_version = get_latest_version()
+def _current_version(args):
+    with args.run.phase('current'), args.budget.phase('discovery'):
+        version = get_current_version(args.budget.timeout())
+    if version:
+        args.run.set_versions(current=version.version)
+    return version
+
+def _lookup_version(args):
+    if args.version_pin:
+        return Version(args.version_pin)
+    if args.offline or args.cache_ttl:
+        state = cache.load_state()
+        if args.offline:
+            return Version(state['latest']) if state else None
+        if state and 0 <= time.time() - state.get('checked', 0) < args.cache_ttl:
+            return Version(state['latest'])
+    latest_version = get_latest_version(args.endpoints, args.circuits)
+    if latest_version:
+        try:
+            cache.save_state(latest_version.version)
+        except OSError:
+            pass
+    return latest_version
+
+def compare_only(args):
+    '''Check for new version but don't update, returns the exit code'''
+    current_version = _current_version(args)
+    latest_version = _target_version(args)
     if not latest_version:
+        args.run.outcome = 'check-failed'
         print("failed to fetch latest version. aborting.")
-    else:
-        print("current version: %s" % (current_version.to_string() if
-            current_version else None))
-        print("latest  version: %s" % (latest_version.to_string() if
-            latest_version else None))
+        return 1
+    print("current version: %s" % (current_version.to_string() if
+        current_version else None))
+    print("latest  version: %s" % (latest_version.to_string() if
+        latest_version else None))
+    return 0
+
+def _wait_for_capacity(args):
+    '''waits while the host is over the --max-load/--max-pressure limits
+
+    Raises pressure.Deferred if it still is after --defer-wait seconds.'''
+    if not args.pressure_limits:
+        return
+    from . import pressure  # pylint: disable=import-outside-toplevel
+    wait = args.defer_wait
+    remaining = args.budget.remaining()
+    if remaining is not None:
+        wait = max(min(wait, remaining), 0)
+    with args.run.phase('pressure'):
+        try:
+            values = pressure.wait(args.pressure_limits, args.proc_root, wait)
+        except pressure.Deferred as err:
+            args.run.pressure = err.values
+            raise
+    args.run.pressure = values
+    if values and not args.quiet:
+        print("system load within limits (%s)" %
+              ', '.join('%s %.2f' % item for item in sorted(values.items())))
+
+def batch_update(args):
+    '''Update all given prefixes and roots, downloading and extracting only once'''
+    latest_version = _target_version(args)
+    if not latest_version:
+        args.run.outcome = 'check-failed'
+        print("failed to fetch latest version. aborting.")
+        return 1
+    if platform == 'linux':
+        if args.roots and (args.sudo or args.installer != 'native'):
+            print("--root requires the native installer without --sudo")
+            return 2
+        with args.run.phase('install'):
+            return _linux_batch_install(latest_version, args)
+    if args.roots:
+        print("--root is only supported on Linux")
+        return 2
+    _wait_for_capacity(args)
+    failed = 0
+    for prefix in args.prefixes:
+        if not args.quiet:
+            print("%s: installing AWS CLI version %s" % (prefix, latest_version.version))
+        with args.run.phase('install'):
+            if not install_new_version(latest_version, _prefix_args(args, prefix)):
+                failed += 1
+    if failed:
+        args.run.outcome = 'failed'
+    return 1 if failed else 0
 
 def compare_and_update(args):
-    '''Check for new version and install if available'''
-    current_version = get_current_version()
-    latest_version = get_latest_version()
+    '''Check for new version and install if available, returns the exit code'''
+    current_version = _current_version(args)
+    latest_version = _target_version(args)
     if not latest_version:
+        args.run.outcome = 'check-failed'
         print("failed to fetch latest version. aborting.")
-    elif current_version and not current_version.v_2:
+        return 1
+    if current_version and not current_version.v_2:
+        args.run.outcome = 'v1-installed'
         print("AWS CLI v1 installed. Remove AWS CLI v1 first. aborting")
-    elif not current_version:
-        if not args.quiet:
-            print("installing AWS CLI version %s" % latest_version.version)
-        install_new_version(latest_version, args)
-    elif current_version != latest_version:
+        return 0
+    if current_version and current_version == latest_version:
+        args.run.outcome = 'up-to-date'
         if not args.quiet:
-            print("updating AWS CLI from version %s to %s" %
+            print("AWS CLI already on latest version. skipping.")
+        return 0
+    _wait_for_capacity(args)
+    if not args.quiet and current_version:
+        print("updating AWS CLI from version %s to %s" %
               (current_version.version, latest_version.version))
-        install_new_version(latest_version, args)
-    else:
+    elif not args.quiet:
+        print("installing AWS CLI version %s" % latest_version.version)
+    with args.run.phase('install'):
+        installed = install_new_version(latest_version, args)
+    if not installed:
+        args.run.outcome = 'failed'
+        print("failed to install AWS CLI version %s. aborting." % latest_version.version)
+        return 1
+    args.run.outcome = 'installed'
+    return 0
+
+def _fetch_manifest(version, args):
+    with ZipFile(_cached_artifact(version, args)) as zipfile:
+        _save_manifest(version, zipfile)
+        return verify.manifest_from_zip(zipfile)
+
+def verify_install(args):
+    '''Check an installed AWS CLI tree against its archive manifest'''
+    install = layout.install_dir(args.prefix)
+    version = args.release or layout.current_version(install)
+    if not version:
+        print("no AWS CLI v2 installation found in %s" % install)
+        return 2
+    dist = "%s/dist" % layout.version_dir(install, version)
+    if not os.path.isdir(dist):
+        print("AWS CLI version %s is not installed in %s" % (version, install))
+        return 2
+    manifest = cache.load_manifest(version)
+    if manifest is None:
+        import requests  # pylint: disable=import-outside-toplevel
+        try:
+            manifest = _fetch_manifest(version, args)
+        except (requests.RequestException, BadZipFile) as err:
+            print("failed to fetch archive manifest: %s" % err)
+            return 2
+    with args.run.phase('verify'):
+        problems = verify.verify_tree(dist, manifest, args.jobs, chunk_size=args.chunk_size)
+    for name, problem in problems:
+        print("%s: %s" % (name, problem))
+    if problems:
+        print("AWS CLI %s: %d of %d files damaged" %
+              (version, len(problems), len(manifest)))
+        return 1
+    if not args.quiet:
+        print("AWS CLI %s: %d files ok" % (version, len(manifest)))
+    return 0
+
+def rollback(args):
+    '''Switch back to a retained (or cached) older AWS CLI version'''
+    if platform != 'linux':
+        print("rollback is only supported on Linux")
+        return 2
+    install_dir = layout.install_dir(args.prefix)
+    current = layout.current_version(install_dir)
+    release = args.release
+    if not release and not current:
+        print("no AWS CLI v2 installation found in %s" % install_dir)
+        return 2
+    if not release:
+        older = [version for version in install.retained_versions(install_dir)
+                 if layout.version_key(version) < layout.version_key(current)]
+        if not older:
+            print("no AWS CLI version older than %s retained in %s" %
+                  (current, install_dir))
+            return 2
+        release = older[-1]
+    if release == current:
         if not args.quiet:
-            print("AWS CLI already on latest version. skipping.")
+            print("AWS CLI already on version %s. skipping." % release)
+        return 0
+    if not args.quiet and current:
+        print("rolling back AWS CLI from version %s to %s" % (current, release))
+    elif not args.quiet:
+        print("no AWS CLI version installed, installing version %s" % release)
+    if not install_new_version(Version(release), args):
+        args.run.outcome = 'failed'
+        print("failed to switch to AWS CLI version %s. aborting." % release)
+        return 1
+    return 0
+
+def collect_garbage(args):
+    '''Remove old version directories according to the retention policy'''
+    if args.keep is None and args.keep_days is None:
+        print("gc needs --keep and/or --keep-days")
+        return 2
+    from . import gc  # pylint: disable=import-outside-toplevel
+    for root in args.roots or [None]:
+        # symlinks below a root lead to paths inside of it, never to the host's
+        install_dir = layout.in_root(root, layout.install_dir(args.prefix))
+        removed = gc.collect(install_dir, args.keep, args.keep_days)
+        if not args.quiet:
+            for version in removed:
+                print("removed AWS CLI version %s" % version)
+    return 0
+
+def prewarm_install(args):
+    '''Read the hot files of the current version into the page cache'''
+    from . import prewarm  # pylint: disable=import-outside-toplevel
+    install_dir = layout.install_dir(args.prefix)
+    version = layout.current_version(install_dir)
+    if not version:
+        print("no AWS CLI v2 installation found in %s" % install_dir)
+        return 2
+    dist = '%s/dist' % layout.version_dir(install_dir, version)
+    if args.learn and args.learn != version:
+        prewarm.learn('%s/dist' % layout.version_dir(install_dir, args.learn), args.learn)
+        prewarm.evict(dist)
+    count, size = prewarm.prefetch(dist, prewarm.hot_files(version))
+    if not args.quiet:
+        print("prewarming %d files (%.1f MiB) of AWS CLI version %s" %
+              (count, size / (1 << 20), version))
+    if args.keep is not None or args.keep_days is not None:
+        from . import gc  # pylint: disable=import-outside-toplevel
+        gc.collect(install_dir, args.keep, args.keep_days)
+    return 0
+
+def _for_each_prefix(command, args):
+    if len(args.prefixes) < 2:
+        return command(args)
+    return max(command(_prefix_args(args, prefix)) for prefix in args.prefixes)
+
+def run_mirror(args):
+    '''Serve the tags answer and installer artifacts to other hosts'''
+    from . import serve  # pylint: disable=import-outside-toplevel
+    upstream = serve.Upstream(args.endpoints, args.tags_ttl)
+    server = serve.make_server(args.bind, args.port, upstream,
+                               endpoints.TAGS_PATH, quiet=args.quiet)
+    if not args.quiet:
+        print("serving AWS CLI mirror on http://%s:%d" % server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+def export_bundle(args):
+    '''Write cached artifacts, manifests and version state into a bundle'''
+    releases = args.releases
+    if not releases:
+        latest_version = _target_version(args)
+        if not latest_version:
+            print("failed to fetch latest version. aborting.")
+            return 1
+        releases = [latest_version.version]
+    names = []
+    for key in args.platforms or [endpoints.platform_key()]:
+        for release in releases:
+            artifact = _cached_artifact(release, args, key)
+            if not isinstance(artifact, str):
+                print("failed to store %s in the cache" %
+                      args.endpoints.artifact_name(release, key))
+                return 1
+            if key.startswith('linux') and cache.load_manifest(release) is None:
+                with ZipFile(artifact) as zipfile:
+                    _save_manifest(release, zipfile)
+            names.append(os.path.basename(artifact))
+    from . import bundle  # pylint: disable=import-outside-toplevel
+    bundle.export_bundle(args.out, names, releases)
+    if not args.quiet:
+        print("wrote %s (%s)" % (args.out, ', '.join(names)))
+    return 0
+
+def import_bundle(args):
+    '''Pre-seed the cache from a bundle'''
+    from . import bundle  # pylint: disable=import-outside-toplevel
+    imported = bundle.import_bundle(args.bundle_file)
+    if not args.quiet:
+        for name in imported:
+            print("imported %s" % name)
+    return 0
+
+def export_layer(args):
+    '''Write a version as a reproducible layer tarball'''
+    release = args.release
+    if not release:
+        latest_version = _target_version(args)
+        if not latest_version:
+            print("failed to fetch latest version. aborting.")
+            return 1
+        release = latest_version.version
+    key = args.platform
+    if not key:
+        key = endpoints.platform_key()
+        key = key if key.startswith('linux') else 'linux-x86_64'
+    # SOURCE_DATE_EPOCH is the common convention for reproducible builds
+    mtime = int(os.environ.get('SOURCE_DATE_EPOCH', '0'))
+    with ZipFile(_cached_artifact(release, args, key)) as zipfile:
+        from . import layer  # pylint: disable=import-outside-toplevel
+        digest = layer.write_layer(zipfile, release, args.out, args.prefix, mtime)
+    if args.quiet:
+        print(digest)
+    else:
+        print("wrote %s for AWS CLI %s: %s" % (args.out, release, digest))
+    return 0
 
 def main():
     '''Module main loop'''
     args = _parse_arguments()
+    if args.profile:
+        return profiling.profile(lambda: _main(args), args.profile, args.profile_format)
+    return _main(args)
+
+def _command_name(args):
+    if args.command == 'bundle':
+        return 'bundle %s' % args.bundle_command
+    return args.command or ('noop' if args.noop else 'update')
+
+def _request_failed(err):
+    '''returns True if err is an error of requests (HTTP status, connection)'''
+    # requests is only loaded by endpoints.fetch, runs without downloads never import it
+    requests = sys.modules.get('requests')
+    return requests is not None and isinstance(err, requests.RequestException)
+
+def _main(args):
+    args.run = history.Run(_command_name(args))
+    args.budget = deadline.Deadline(args.deadline, dict(args.timeouts))
+    # pylint: disable=import-outside-toplevel
+    from . import circuit, pressure
+    args.circuits = circuit.Circuits.load(args.ignore_circuits)
+    if args.background:
+        from . import background
+        applied = background.lower_priority()
+        if not args.quiet:
+            print("running in the background (%s)" % (', '.join(applied) or 'priority unchanged'))
+    code = None
+    try:
+        code = _run_command(args)
+    except OfflineError as err:
+        print("offline: %s. aborting." % err)
+        args.run.outcome = 'offline'
+        code = 1
+    except download.VerificationError as err:
+        print("verification failed: %s. aborting." % err)
+        args.run.outcome = 'verification-failed'
+        code = 1
+    except circuit.Unreachable as err:
+        print("unreachable: %s. aborting." % err)
+        args.run.outcome = 'unreachable'
+        code = 1
+    except pressure.Deferred as err:
+        if not args.quiet:
+            print("install deferred, the system is busy: %s" % err)
+        args.run.outcome = 'deferred'
+        code = pressure.EXIT_CODE
+    except deadline.DeadlineExceeded as err:
+        print("%s. aborting." % err)
+        args.run.outcome = 'timeout'
+        code = deadline.EXIT_CODE
+    except Exception as err:  # pylint: disable=broad-except
+        if not _request_failed(err):
+            raise
+        print("download failed: %s. aborting." % err)
+        args.run.outcome = 'download-failed'
+        code = 1
+    finally:
+        try:
+            args.circuits.save()
+        except OSError:
+            pass
+        if args.history and args.command not in ('serve', 'stats'):
+            try:
+                history.append(args.run.record(code))
+            except OSError:
+                pass
+    return code
+
+def show_stats(args):
+    '''Print percentiles per phase and a rolling summary of the recorded runs'''
+    records = history.load(time.time() - args.days * history.DAY)
+    if not records:
+        print("no runs recorded in the last %g days" % args.days)
+        return 0
+    for line in history.summarize(records):
+        print(line)
+    return 0
+
+def _run_command(args):
+    if args.command == 'bundle':
+        if args.bundle_command == 'export':
+            return export_bundle(args)
+        return import_bundle(args)
+    if args.command == 'export-layer':
+        return export_layer(args)
+    if args.command == 'verify':
+        return _for_each_prefix(verify_install, args)
+    if args.command == 'rollback':
+        return _for_each_prefix(rollback, args)
+    if args.command == 'gc':
+        return _for_each_prefix(collect_garbage, args)
+    if args.command == 'prewarm':
+        return _for_each_prefix(prewarm_install, args)
+    if args.command == 'serve':
+        return run_mirror(args)
+    if args.command == 'stats':
+        return show_stats(args)
+    if (len(args.prefixes) > 1 or args.roots) and not args.noop:
+        return batch_update(args)
     if args.noop:
-        compare_only()
-    else:
-        compare_and_update(args)
+        return compare_only(args)
+    return compare_and_update(args)
@@ -0,0 +1,95 @@
+'''verify an installed AWS CLI tree against the archive manifest'''
+
+import functools
+import os
+import zlib
+from . import cache
+
+DIST_PREFIX = 'aws/dist/'
+CHUNK_SIZE = 1 << 20
+# below this many files a process pool costs more than it saves
+POOL_THRESHOLD = 64
+
+
+def manifest_from_zip(zipfile):
+    '''returns {relative path: [size, crc32]} of the dist tree in the archive'''
+    files = {}
+    for info in zipfile.infolist():
+        if info.filename.startswith(DIST_PREFIX) and not info.is_dir():
+            files[info.filename[len(DIST_PREFIX):]] = [info.file_size, info.CRC]
+    return files
+
+def _unreadable(err):
+    return 'unreadable (%s)' % (err.strerror or err)
+
+def _checksum(path, chunk_size=CHUNK_SIZE):
+    '''returns the crc32 of the file at path, or the problem reading it'''
+    crc = 0
+    try:
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(chunk_size), b''):
+                crc = zlib.crc32(chunk, crc)
+    except OSError as err:
+        # raised in a pool worker it would end the whole check
+        return _unreadable(err)
+    return crc
+
+def _stat(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+def verify_tree(dist, manifest, jobs=None, key=None, reuse=True, chunk_size=CHUNK_SIZE):
+    '''compares the files below dist with the manifest
+
+    Files whose size and mtime match the last successful check are not read
+    again (unless reuse is False). The fingerprints are stored for the tree
+    key (default dist), which allows checking a tree before it is moved to its
+    final place. Returns a sorted list of (relative path, problem) tuples.'''
+    fingerprint_file = cache.fingerprint_path(key or dist)
+    known = (cache.read_json(fingerprint_file) or {}) if reuse else {}
+    fingerprints = {}
+    problems = []
+    pending = []
+    for name, (size, crc) in manifest.items():
+        try:
+            stat = _stat(os.path.join(dist, name))
+        except OSError as err:
+            problems.append((name, _unreadable(err)))
+            continue
+        if stat is None:
+            problems.append((name, 'missing'))
+        elif stat[0] != size:
+            problems.append((name, 'size %d != %d' % (stat[0], size)))
+        elif known.get(name) == stat:
+            fingerprints[name] = stat
+        else:
+            pending.append((name, stat, crc))
+
+    paths = [os.path.join(dist, name) for name, _, _ in pending]
+    checksum = functools.partial(_checksum, chunk_size=chunk_size)
+    if len(paths) < POOL_THRESHOLD or jobs == 1:
+        checksums = map(checksum, paths)
+        results = list(zip(pending, checksums))
+    else:
+        # multiprocessing is slow to import and rarely needed
+        from concurrent.futures import ProcessPoolExecutor  # pylint: disable=import-outside-toplevel
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            checksums = executor.map(checksum, paths, chunksize=16)
+            results = list(zip(pending, checksums))
+    for (name, stat, crc), actual in results:
+        if actual == crc:
+            fingerprints[name] = stat
+        elif isinstance(actual, str):
+            problems.append((name, actual))
+        else:
+            problems.append((name, 'checksum mismatch'))
+
+    if fingerprints != known:
+        try:
+            cache.write_json(fingerprint_file, fingerprints)
+        except OSError:
+            pass
+    return sorted(problems)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+'''compare the inflate backends on the real AWS CLI archive
+
+usage: python benchmarks/bench_inflate.py [--repeat N] [--extract] [ARCHIVE]
+
+Without ARCHIVE the latest Linux archive is taken from the awscli-update cache
+(downloading it if needed). Every installed backend decompresses all members
+(or extracts them to a temporary directory with --extract); the digest over
+all output must be the same for every backend. Prints JSON.'''
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from zipfile import ZipFile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from awscli_update import cache, endpoints, inflate, install, update
+
+
+def _latest_archive():
+    version = update.get_latest_version()
+    if not version:
+        sys.exit('failed to fetch latest version')
+    config = endpoints.Endpoints()
+    path = cache.artifact_path(config.artifact_name(version.version, 'linux-x86_64'))
+    if not os.path.isfile(path):
+        with endpoints.fetch(config.artifact_urls(version.version, 'linux-x86_64')) as result:
+            cache.save_artifact(path, result.content)
+    return path
+
+def _decompress(zipfile, backend):
+    digest = hashlib.sha256()
+    with inflate.Reader(zipfile) as reader:
+        for info in zipfile.infolist():
+            digest.update(info.filename.encode('utf-8'))
+            for chunk in reader.chunks(info, backend):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+def _extract(zipfile, backend):
+    digest = hashlib.sha256()
+    with tempfile.TemporaryDirectory() as tmp:
+        install.extract_members(zipfile, tmp, backend=backend)
+        for info in zipfile.infolist():
+            if info.is_dir():
+                continue
+            digest.update(info.filename.encode('utf-8'))
+            with open(os.path.join(tmp, info.filename), 'rb') as file:
+                for chunk in iter(lambda: file.read(1 << 20), b''):
+                    digest.update(chunk)
+    return digest.hexdigest()
+
+def main():
+    '''runs the benchmark'''
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--extract', action='store_true',
+                        help='write the files instead of only decompressing them')
+    parser.add_argument('archive', nargs='?')
+    args = parser.parse_args()
+    archive = args.archive or _latest_archive()
+    run = _extract if args.extract else _decompress
+    results = {}
+    with ZipFile(archive) as zipfile:
+        size = sum(info.file_size for info in zipfile.infolist())
+        for name in inflate.BACKENDS:
+            try:
+                backend = inflate.load(name)
+            except ImportError:
+                continue
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                digest = run(zipfile, backend)
+                timings.append(time.perf_counter() - start)
+            results[name] = {
+                'seconds': min(timings),
+                'mb_per_second': size / min(timings) / 1e6,
+                'sha256': digest,
+            }
+    baseline = results['zlib']['seconds']
+    for result in results.values():
+        result['speedup'] = baseline / result['seconds']
+    identical = len({result['sha256'] for result in results.values()}) == 1
+    print(json.dumps({
+        'archive': os.path.basename(archive),
+        'uncompressed_bytes': size,
+        'mode': 'extract' if args.extract else 'decompress',
+        'identical': identical,
+        'backends': results,
+    }, indent=2))
+    return 0 if identical else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+'''startup latency of awscli-update, checked against the budgets in startup_budget.json
+
+usage: python benchmarks/bench_startup.py [--repeat N] [--budget FILE]
+                                          [--write-budget] [--out FILE]
+
+awscli-update runs from cron on every host, so its fixed startup cost
+matters. Three invocations are timed until exit:
+
+version  `--version`
+noop     `-n` with a warm cache (the latest version was looked up recently)
+quiet    `-q` with nothing to do (the latest version is installed), asking
+         a local stand-in for the tags API
+
+each one cold (the package without bytecode, as right after an install or
+upgrade) and warm (bytecode cached). Reported and budgeted is the median time
+above a bare `python -c pass` started the same way, which takes the speed of
+the machine and the interpreter's own startup out of the numbers.
+
+Exits 1 if a median exceeds its budget. --write-budget stores the measured
+numbers plus 50% headroom as new budgets instead.'''
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import harness
+
+# pylint: disable=wrong-import-order
+from awscli_update import cache
+
+LATEST = '2.99.0'
+BUDGET = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup_budget.json')
+HEADROOM = 1.5
+SCENARIOS = {
+    'version': ['--version'],
+    'noop': ['-n', '--cache-ttl', '3600'],
+    'quiet': ['-q'],
+}
+
+
+def _copy_package(dest, compiled):
+    shutil.copytree(os.path.join(harness.ROOT, 'awscli_update'),
+                    os.path.join(dest, 'awscli_update'),
+                    ignore=shutil.ignore_patterns('__pycache__'))
+    if compiled:
+        subprocess.check_call([sys.executable, '-m', 'compileall', '-q', dest])
+
+def _time(command, env, cwd):
+    start = time.perf_counter()
+    subprocess.run(command, env=env, cwd=cwd, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+def measure(tmp, mirror, repeat):
+    '''returns {scenario: {'cold': ms, 'warm': ms}} above the bare interpreter'''
+    env = harness.fake_aws(os.path.join(tmp, 'aws'), LATEST)
+    env['AWSCLI_UPDATE_CACHE'] = os.path.join(tmp, 'cache')
+    env['AWSCLI_UPDATE_MIRROR'] = mirror
+    env['AWSCLI_UPDATE_CONFIG'] = os.devnull
+    # a warm cache: the latest version was looked up a moment ago
+    os.environ['AWSCLI_UPDATE_CACHE'] = env['AWSCLI_UPDATE_CACHE']
+    cache.save_state(LATEST)
+    results = {name: {} for name in SCENARIOS}
+    for mode in ('cold', 'warm'):
+        package = os.path.join(tmp, mode)
+        _copy_package(package, compiled=mode == 'warm')
+        run_env = dict(env)
+        run_env.pop('PYTHONDONTWRITEBYTECODE', None)
+        if mode == 'cold':
+            run_env['PYTHONDONTWRITEBYTECODE'] = '1'
+        baseline = statistics.median(
+            _time([sys.executable, '-c', 'pass'], run_env, package) for _ in range(repeat))
+        for name, arguments in SCENARIOS.items():
+            command = [sys.executable, '-m', 'awscli_update', *arguments]
+            median = statistics.median(_time(command, run_env, package) for _ in range(repeat))
+            results[name][mode] = round((median - baseline) * 1000, 1)
+    return results
+
+def check(results, budgets):
+    '''returns the list of (scenario, mode, ms, budget) over budget'''
+    return [(name, mode, value, budgets[name][mode])
+            for name, modes in results.items() for mode, value in modes.items()
+            if name in budgets and mode in budgets[name] and value > budgets[name][mode]]
+
+def main():
+    '''runs the benchmark'''
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=15)
+    parser.add_argument('--budget', default=BUDGET, help='budget file (default is %(default)s)')
+    parser.add_argument('--write-budget', action='store_true',
+                        help='store the measured times plus headroom as the new budgets')
+    parser.add_argument('--out', help='also write the JSON result to this file')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        served = os.path.join(tmp, 'served')
+        os.mkdir(served)
+        with harness.Upstream(served, [LATEST]) as upstream:
+            results = measure(tmp, upstream.url, args.repeat)
+    if args.write_budget:
+        budgets = {name: {mode: round(value * HEADROOM) for mode, value in modes.items()}
+                   for name, modes in results.items()}
+        with open(args.budget, 'w') as file:
+            json.dump({
+                'unit': 'ms above `python -c pass`',
+                'budgets': budgets,
+            }, file, indent=2)
+            file.write('\n')
+    with open(args.budget) as file:
+        budgets = json.load(file)['budgets']
+    over = check(results, budgets)
+    report = json.dumps({
+        'unit': 'ms above `python -c pass`',
+        'results': results,
+        'budgets': budgets,
+        'over_budget': ['%s (%s): %.1f > %s' % entry for entry in over],
+    }, indent=2)
+    print(report)
+    if args.out:
+        with open(args.out, 'w') as file:
+            file.write(report + '\n')
+    return 1 if over else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
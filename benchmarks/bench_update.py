@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+'''end-to-end benchmarks of awscli-update against a local upstream
+
+usage: python benchmarks/bench_update.py [--size-mb N] [--files N] [--repeat N]
+                                         [--latency SECONDS] [--out FILE]
+                                         [--baseline FILE] [BENCHMARK ...]
+
+A local server (see harness) stands in for the GitHub tags API and
+awscli.amazonaws.com, serving a synthetic archive of the given size and file
+count; a fake `aws` on PATH reports the installed version. The benchmarks:
+
+noop            `-n` with the latest version installed
+cold-install    install into an empty prefix with an empty cache
+cached-install  install into an empty prefix with the archive cached
+extract         extract the archive in-process, without any network
+
+Each one runs --repeat times. Prints (and with --out writes) JSON with the
+commit, the timings and peak RSS; with --baseline (JSON of an earlier run)
+every benchmark also gets its time relative to the baseline.'''
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from zipfile import ZipFile
+
+import harness
+
+# pylint: disable=wrong-import-order
+from awscli_update import install
+
+LATEST = '2.99.0'
+INSTALLED = '2.98.0'
+BENCHMARKS = ('noop', 'cold-install', 'cached-install', 'extract')
+
+
+def _commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=harness.ROOT,
+            stderr=subprocess.DEVNULL).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class Bench:
+    '''runs the benchmarks in a scratch directory'''
+    def __init__(self, tmp, mirror, archive):
+        self.tmp = tmp
+        self.mirror = mirror
+        self.archive = archive
+        self.runs = 0
+
+    def _scratch(self, name):
+        self.runs += 1
+        return os.path.join(self.tmp, '%s-%d' % (name, self.runs))
+
+    def _update(self, installed, cache, prefix=None, noop=False):
+        env = harness.fake_aws(os.path.join(self.tmp, 'aws-%s' % installed), installed)
+        env['AWSCLI_UPDATE_CACHE'] = cache
+        arguments = ['--mirror', self.mirror, '-q']
+        if noop:
+            arguments.append('-n')
+        if prefix:
+            arguments += ['--prefix', prefix]
+        code, seconds, peak = harness.run(arguments, env)
+        if code != 0:
+            raise RuntimeError('awscli-update %s exited with %d' % (' '.join(arguments), code))
+        return seconds, peak
+
+    def noop(self):
+        '''checks for an update without installing'''
+        return self._update(LATEST, self._scratch('cache'), noop=True)
+
+    def cold_install(self):
+        '''downloads and installs into a fresh prefix'''
+        return self._update(INSTALLED, self._scratch('cache'), self._scratch('prefix'))
+
+    def cached_install(self):
+        '''installs into a fresh prefix from the cached archive'''
+        cache = os.path.join(self.tmp, 'warm-cache')
+        if not os.path.isdir(cache):
+            self._update(INSTALLED, cache, self._scratch('prefix'))
+        return self._update(INSTALLED, cache, self._scratch('prefix'))
+
+    def extract(self):
+        '''extracts the archive in this process'''
+        dest = self._scratch('extract')
+        start = time.perf_counter()
+        with ZipFile(self.archive) as zipfile:
+            install.extract_members(zipfile, dest)
+        seconds = time.perf_counter() - start
+        shutil.rmtree(dest)
+        return seconds, None
+
+
+def _summary(samples):
+    seconds = [sample[0] for sample in samples]
+    peaks = [sample[1] for sample in samples if sample[1] is not None]
+    return {
+        'seconds': seconds,
+        'min': min(seconds),
+        'median': statistics.median(seconds),
+        'peak_rss_mib': round(max(peaks) / harness.MIB, 1) if peaks else None,
+    }
+
+def _compare(results, path):
+    with open(path) as file:
+        baseline = json.load(file)['benchmarks']
+    for name, result in results.items():
+        if name in baseline:
+            result['relative_to_baseline'] = round(result['median'] / baseline[name]['median'], 3)
+
+def main():
+    '''runs the benchmarks'''
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=int, default=100,
+                        help='uncompressed size of the archive in MiB')
+    parser.add_argument('--files', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='delay of every upstream answer in seconds')
+    parser.add_argument('--out', help='also write the JSON result to this file')
+    parser.add_argument('--baseline', help='JSON result of an earlier run to compare with')
+    parser.add_argument('benchmarks', nargs='*', metavar='BENCHMARK',
+                        help='benchmarks to run: %s (default is all)' % ', '.join(BENCHMARKS))
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error('unknown benchmarks: %s' % ', '.join(sorted(unknown)))
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        served = os.path.join(tmp, 'served')
+        os.mkdir(served)
+        archive = harness.make_archive(os.path.join(served, harness.artifact_name(LATEST)),
+                                       LATEST, args.size_mb, args.files)
+        with harness.Upstream(served, [LATEST, INSTALLED], args.latency) as upstream:
+            bench = Bench(tmp, upstream.url, archive)
+            for name in args.benchmarks or BENCHMARKS:
+                run = getattr(bench, name.replace('-', '_'))
+                results[name] = _summary([run() for _ in range(args.repeat)])
+        compressed = os.path.getsize(archive)
+    if args.baseline:
+        _compare(results, args.baseline)
+    report = json.dumps({
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'archive': {
+            'files': args.files,
+            'uncompressed_mib': args.size_mb,
+            'compressed_mib': round(compressed / harness.MIB, 1),
+        },
+        'latency': args.latency,
+        'repeat': args.repeat,
+        'benchmarks': results,
+    }, indent=2)
+    print(report)
+    if args.out:
+        with open(args.out, 'w') as file:
+            file.write(report + '\n')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
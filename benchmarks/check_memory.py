@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+'''check that --max-memory bounds the peak RSS of an install
+
+usage: python benchmarks/check_memory.py [--max-memory SIZE] [--zero-mb N]
+                                         [--random-mb N] [--files N] [--compare]
+
+Builds a synthetic AWS CLI archive with a large, extremely compressible member
+(inflating a single read of it unbounded would take hundreds of MiB), a large
+incompressible one and many small files, serves it from a local HTTP server
+and installs and verifies it with `--max-memory`. The peak RSS of every run is
+taken from wait4(). Prints JSON and exits 1 if a run exceeded the limit.'''
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import harness
+
+# pylint: disable=wrong-import-order
+from awscli_update import memory
+
+VERSION = '2.99.0'
+MIB = harness.MIB
+
+
+def make_archive(path, zero_mb, random_mb, files):
+    '''writes a synthetic AWS CLI archive without holding it in memory'''
+    with ZipFile(path, 'w', ZIP_DEFLATED) as zipfile:
+        zipfile.writestr('aws/install', '#!/bin/sh\nexit 0\n')
+        zipfile.writestr('aws/dist/aws', '#!/bin/sh\necho aws-cli/%s\n' % VERSION)
+        zipfile.writestr('aws/dist/aws_completer', '#!/bin/sh\n')
+        harness.write_member(zipfile, 'aws/dist/zeros.bin',
+                             (bytes(MIB) for _ in range(zero_mb)))
+        harness.write_member(zipfile, 'aws/dist/random.bin',
+                             (os.urandom(MIB) for _ in range(random_mb)))
+        for i in range(files):
+            zipfile.writestr('aws/dist/lib/module%d.py' % i, 'x = %d\n' % i * 64)
+
+def _run_all(args, tmp, mirror):
+    limit = memory.parse_size(args.max_memory)
+    results = []
+    for bounded in (True, False) if args.compare else (True,):
+        mode = 'bounded' if bounded else 'unbounded'
+        env = dict(os.environ, AWSCLI_UPDATE_CACHE=os.path.join(tmp, mode, 'cache'))
+        common = ['--version-pin', VERSION, '--mirror', mirror, '-q']
+        if bounded:
+            common += ['--max-memory', args.max_memory]
+        prefix = os.path.join(tmp, mode, 'prefix')
+        for name, arguments in (
+                ('install', [*common, '--prefix', prefix]),
+                ('staged install', [*common, '--staged', '--prefix', prefix + '-staged']),
+                ('verify', [*common, 'verify', '--prefix', prefix])):
+            code, _, peak = harness.run(arguments, env)
+            results.append({
+                'run': name,
+                'mode': mode,
+                'exit_code': code,
+                'peak_rss_mib': round(peak / MIB, 1),
+                'within_limit': peak <= limit if bounded else None,
+            })
+    return results
+
+def main():
+    '''runs the check'''
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--max-memory', default='64M')
+    parser.add_argument('--zero-mb', type=int, default=512,
+                        help='size of the compressible member in MiB')
+    parser.add_argument('--random-mb', type=int, default=64,
+                        help='size of the incompressible member in MiB')
+    parser.add_argument('--files', type=int, default=2000)
+    parser.add_argument('--compare', action='store_true',
+                        help='also measure the same runs without --max-memory')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        served = os.path.join(tmp, 'served')
+        os.mkdir(served)
+        make_archive(os.path.join(served, harness.artifact_name(VERSION)),
+                     args.zero_mb, args.random_mb, args.files)
+        with harness.Upstream(served, [VERSION]) as upstream:
+            results = _run_all(args, tmp, upstream.url)
+    ok = all(result['exit_code'] == 0 and result['within_limit'] is not False
+             for result in results)
+    print(json.dumps({
+        'max_memory_mib': round(memory.parse_size(args.max_memory) / MIB, 1),
+        'archive_mib': args.zero_mb + args.random_mb,
+        'files': args.files,
+        'ok': ok,
+        'runs': results,
+    }, indent=2))
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+'''check that --max-load and --max-pressure defer busy installs and let calm ones through
+
+usage: python benchmarks/check_pressure.py
+
+Serves a small synthetic AWS CLI archive from a local HTTP server and runs
+installs with `--proc-root` pointing at fake `loadavg` and `pressure/io`
+files. A run above a limit has to exit with 75 and leave the prefix
+untouched, a run within the limits (or without PSI files, as on kernels
+before 4.20) has to install. Prints JSON and exits 1 if a run did not.'''
+
+import json
+import os
+import sys
+import tempfile
+
+import harness
+
+# pylint: disable=wrong-import-order
+from awscli_update import layout, pressure
+
+VERSION = '2.99.0'
+CALM = {'loadavg': 0.05, 'io': 1.0}
+BUSY = {'loadavg': 1000.0, 'io': 80.0}
+# (name, /proc values or None for no PSI, limits, expected exit code)
+CASES = (
+    ('load above limit', {'loadavg': BUSY['loadavg'], 'io': CALM['io']},
+     ['--max-load', '2'], pressure.EXIT_CODE),
+    ('io pressure above limit', {'loadavg': CALM['loadavg'], 'io': BUSY['io']},
+     ['--max-pressure', 'io=50'], pressure.EXIT_CODE),
+    ('within limits', CALM,
+     ['--max-load', '2', '--max-pressure', 'io=50'], 0),
+    ('no pressure files', {'loadavg': CALM['loadavg'], 'io': None},
+     ['--max-load', '2', '--max-pressure', 'io=50'], 0),
+)
+
+
+def fake_proc(path, loadavg, io):
+    '''writes loadavg and, unless io is None, pressure/io like the kernel does'''
+    os.makedirs(path)
+    with open(os.path.join(path, 'loadavg'), 'w') as file:
+        file.write('%.2f %.2f %.2f 1/100 4242\n' % (loadavg, loadavg, loadavg))
+    if io is None:
+        return
+    os.makedirs(os.path.join(path, 'pressure'))
+    with open(os.path.join(path, 'pressure', 'io'), 'w') as file:
+        file.write('some avg10=%.2f avg60=0.00 avg300=0.00 total=0\n' % io)
+        file.write('full avg10=0.00 avg60=0.00 avg300=0.00 total=0\n')
+
+def _run_all(tmp, mirror):
+    results = []
+    for index, (name, values, limits, expected) in enumerate(CASES):
+        proc_root = os.path.join(tmp, 'proc%d' % index)
+        fake_proc(proc_root, values['loadavg'], values['io'])
+        prefix = os.path.join(tmp, 'prefix%d' % index)
+        env = dict(os.environ, AWSCLI_UPDATE_CACHE=os.path.join(tmp, 'cache%d' % index))
+        code, _, _ = harness.run(
+            ['--version-pin', VERSION, '--mirror', mirror, '-q', '--no-history',
+             '--prefix', prefix, '--proc-root', proc_root, *limits], env)
+        installed = layout.current_version(layout.install_dir(prefix)) == VERSION
+        results.append({
+            'run': name,
+            'exit_code': code,
+            'expected_exit_code': expected,
+            'installed': installed,
+            'ok': code == expected and installed == (expected == 0),
+        })
+    return results
+
+def main():
+    '''runs the check'''
+    with tempfile.TemporaryDirectory() as tmp:
+        served = os.path.join(tmp, 'served')
+        os.mkdir(served)
+        harness.make_archive(os.path.join(served, harness.artifact_name(VERSION)),
+                             VERSION, size_mb=1, files=10)
+        with harness.Upstream(served, [VERSION]) as upstream:
+            results = _run_all(tmp, upstream.url)
+    ok = all(result['ok'] for result in results)
+    print(json.dumps({'ok': ok, 'runs': results}, indent=2))
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+'''check that installs and gc with --root never leave the root through symlinks
+
+usage: python benchmarks/check_root.py
+
+First checks layout.in_root on a root with absolute, relative and looping
+symlinks. Then builds a root whose usr/local/aws-cli is an absolute symlink
+to a directory that also exists on the host, holding an older version there.
+Two versions are installed into the root from a local HTTP server, the second
+with `--keep 1`, which removes the first one inside the root in a detached gc
+run; `gc --keep 1 --root` is run once more in the foreground. The host's
+directory has to stay as it was. Prints JSON and exits 1 if a check failed.'''
+
+import errno
+import json
+import os
+import sys
+import tempfile
+import time
+
+import harness
+
+# pylint: disable=wrong-import-order
+from awscli_update import layout
+
+VERSIONS = ('2.99.0', '2.98.0')
+HOST_VERSION = '2.90.0'
+GC_WAIT = 10
+
+
+def _in_root_checks(tmp):
+    root = os.path.join(tmp, 'links')
+    os.makedirs(os.path.join(root, 'usr'))
+    os.symlink('/opt/local', os.path.join(root, 'usr', 'local'))
+    os.symlink('../../../../../../etc', os.path.join(root, 'usr', 'up'))
+    os.symlink('loop', os.path.join(root, 'loop'))
+    checks = [
+        ('absolute symlink', layout.in_root(root, '/usr/local/aws-cli'),
+         os.path.join(root, 'opt', 'local', 'aws-cli')),
+        ('relative symlink above the root', layout.in_root(root, '/usr/up/passwd'),
+         os.path.join(root, 'etc', 'passwd')),
+        ('last component not followed', layout.in_root(root, '/usr/local', follow=False),
+         os.path.join(root, 'usr', 'local')),
+        ('no root', layout.in_root(None, '/usr/local'), '/usr/local'),
+    ]
+    try:
+        layout.in_root(root, '/loop/aws-cli')
+        loop = 'resolved'
+    except OSError as err:
+        loop = errno.errorcode.get(err.errno, str(err))
+    checks.append(('symlink loop', loop, 'ELOOP'))
+    return [{'check': name, 'result': result, 'expected': expected, 'ok': result == expected}
+            for name, result, expected in checks]
+
+def _host_tree(path):
+    return sorted(os.path.relpath(os.path.join(root, name), path)
+                  for root, dirs, files in os.walk(path) for name in dirs + files)
+
+def _gc_checks(tmp, mirror):
+    host = os.path.join(tmp, 'host')
+    harness.fake_aws(host, HOST_VERSION)
+    host_install = layout.install_dir(host)
+    before = _host_tree(host_install)
+    root = os.path.join(tmp, 'root')
+    os.makedirs(os.path.join(root, 'usr', 'local'))
+    # the same absolute path names a directory of the host
+    os.symlink(host_install, layout.install_dir(os.path.join(root, 'usr', 'local')))
+    env = dict(os.environ, AWSCLI_UPDATE_CACHE=os.path.join(tmp, 'cache'))
+    common = ['--mirror', mirror, '-q', '--no-history', '--root', root]
+    codes = [harness.run([*common, '--version-pin', VERSIONS[1]], env)[0],
+             harness.run([*common, '--version-pin', VERSIONS[0], '--keep', '1'], env)[0]]
+    real_install = layout.in_root(root, layout.install_dir(None))
+    old = layout.version_dir(real_install, VERSIONS[1])
+    end = time.monotonic() + GC_WAIT
+    while os.path.lexists(old) and time.monotonic() < end:
+        time.sleep(0.1)
+    removed_by_spawned_gc = not os.path.lexists(old)
+    codes.append(harness.run([*common, 'gc', '--keep', '1'], env)[0])
+    return [
+        {'check': 'runs succeed', 'result': codes, 'expected': [0, 0, 0],
+         'ok': codes == [0, 0, 0]},
+        {'check': 'installed inside the root', 'result': real_install,
+         'expected': os.path.join(root, host_install.lstrip('/')),
+         'ok': real_install == os.path.join(root, host_install.lstrip('/')) and
+               layout.current_version(real_install) == VERSIONS[0]},
+        {'check': 'spawned gc removed the old version in the root',
+         'result': removed_by_spawned_gc, 'expected': True, 'ok': removed_by_spawned_gc},
+        {'check': 'host directory untouched', 'result': _host_tree(host_install),
+         'expected': before, 'ok': _host_tree(host_install) == before},
+    ]
+
+def main():
+    '''runs the check'''
+    with tempfile.TemporaryDirectory() as tmp:
+        results = _in_root_checks(tmp)
+        served = os.path.join(tmp, 'served')
+        os.mkdir(served)
+        for version in VERSIONS:
+            harness.make_archive(os.path.join(served, harness.artifact_name(version)),
+                                 version, size_mb=1, files=10)
+        with harness.Upstream(served, VERSIONS) as upstream:
+            results += _gc_checks(tmp, upstream.url)
+    ok = all(result['ok'] for result in results)
+    print(json.dumps({'ok': ok, 'checks': results}, indent=2))
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
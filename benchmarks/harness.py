@@ -0,0 +1,133 @@
+'''local stand-ins for GitHub and awscli.amazonaws.com used by the benchmarks
+
+- make_archive writes a synthetic, AWS CLI shaped installer zip
+- Upstream serves the tags API answer and the archives like `--mirror`
+  expects them, optionally with added latency
+- fake_aws installs an `aws` reporting a given version (in the layout of the
+  real installer) and puts it on PATH, so the current version check does not
+  depend on what is installed on the machine'''
+
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from zipfile import ZIP_DEFLATED, ZipFile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# pylint: disable=wrong-import-position
+from awscli_update import endpoints
+
+MIB = 1 << 20
+
+
+def artifact_name(version):
+    '''returns the file name of the Linux x86_64 installer of version'''
+    return 'awscli-exe-linux-x86_64-%s.zip' % version
+
+def write_member(zipfile, name, chunks):
+    '''adds a member from an iterable of chunks without holding it in memory'''
+    with zipfile.open(name, 'w', force_zip64=True) as file:
+        for chunk in chunks:
+            file.write(chunk)
+
+def _content(rng, size):
+    # hex text compresses about 2:1, like the Python code in the real archive
+    return rng.randbytes((size + 1) // 2).hex().encode('ascii')[:size]
+
+def make_archive(path, version, size_mb=100, files=2000, seed=0):
+    '''writes an installer zip with files members of size_mb MiB in total
+
+    The content is deterministic for a seed, so runs on different commits
+    work on the same bytes.'''
+    rng = random.Random(seed)
+    per_file = size_mb * MIB // max(files, 1)
+    with ZipFile(path, 'w', ZIP_DEFLATED) as zipfile:
+        zipfile.writestr('aws/install', '#!/bin/sh\nexit 0\n')
+        zipfile.writestr('aws/dist/aws', '#!/bin/sh\necho "aws-cli/%s Python/3 Linux"\n' % version)
+        zipfile.writestr('aws/dist/aws_completer', '#!/bin/sh\n')
+        for i in range(files):
+            name = 'aws/dist/lib/pkg%d/module%d.py' % (i % 50, i)
+            write_member(zipfile, name, (_content(rng, per_file),))
+    return path
+
+def fake_aws(prefix, version):
+    '''installs an `aws` reporting version below prefix, returns an env with it on PATH'''
+    install = os.path.join(prefix, 'aws-cli')
+    dist = os.path.join(install, 'v2', version, 'dist')
+    bin_dir = os.path.join(prefix, 'bin')
+    if not os.path.isdir(dist):
+        os.makedirs(dist)
+        os.makedirs(os.path.join(install, 'v2', version, 'bin'))
+        os.makedirs(bin_dir)
+        with open(os.path.join(dist, 'aws'), 'w') as file:
+            file.write('#!/bin/sh\necho "aws-cli/%s Python/3 Linux"\n' % version)
+        os.chmod(os.path.join(dist, 'aws'), 0o755)
+        os.symlink('../dist/aws', os.path.join(install, 'v2', version, 'bin', 'aws'))
+        os.symlink(os.path.join(install, 'v2', version), os.path.join(install, 'v2', 'current'))
+        os.symlink(os.path.join(install, 'v2', 'current', 'bin', 'aws'),
+                   os.path.join(bin_dir, 'aws'))
+    return dict(os.environ, PATH='%s%s%s' % (bin_dir, os.pathsep, os.environ.get('PATH', '')))
+
+
+class _Handler(SimpleHTTPRequestHandler):
+    tags = b'[]'
+    latency = 0.0
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        '''answers the tags API or serves a file'''
+        time.sleep(self.latency)
+        if self.path.split('?', 1)[0] == endpoints.TAGS_PATH:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(self.tags)))
+            self.end_headers()
+            self.wfile.write(self.tags)
+            return
+        super().do_GET()
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+class Upstream:
+    '''serves the tags answer for versions (newest first) and the files in directory'''
+    def __init__(self, directory, versions, latency=0.0):
+        handler = type('Handler', (_Handler,), {
+            'tags': json.dumps([{'name': version} for version in versions]).encode('utf-8'),
+            'latency': latency,
+        })
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), partial(handler, directory=directory))
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        '''returns the base URL to pass to --mirror'''
+        return 'http://127.0.0.1:%d' % self.server.server_port
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def run(arguments, env, cwd=ROOT):
+    '''runs awscli-update, returns (exit code, seconds, peak RSS in bytes)'''
+    start = time.perf_counter()
+    process = subprocess.Popen(  # pylint: disable=consider-using-with
+        [sys.executable, '-m', 'awscli_update', *arguments],
+        cwd=cwd, env=env, stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    seconds = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, seconds, usage.ru_maxrss * 1024
@@ -24,6 +24,10 @@ setup(
     packages=find_packages(exclude=('tests', 'docs')),
     scripts=['bin/awscli-update'],
     install_requires=required,
+    extras_require={
+        'isal': ['isal'],
+        'zlib-ng': ['zlib-ng'],
+    },
     classifiers=[
         'Environment :: Console',
         'Intended Audience :: Developers',